@@ -0,0 +1,87 @@
+"""
+Microbenchmark: single-pass feature walker vs the per-field GenBank extractors
+
+Usage: python benchmark_genbank_features.py
+"""
+import timeit
+import xml.etree.ElementTree as ET
+import ncbi
+from ncbi import (
+    lxml_etree,
+    parse_genbank_proteins,
+    walk_genbank_features,
+    extract_genbank_taxid,
+    extract_genbank_mrna,
+    extract_gene_name_from_features,
+)
+
+def make_qualifier(name, value):
+    return (
+        f"<GBQualifier><GBQualifier_name>{name}</GBQualifier_name>"
+        f"<GBQualifier_value>{value}</GBQualifier_value></GBQualifier>"
+    )
+
+def make_feature(key, qualifiers):
+    quals = ''.join(make_qualifier(name, value) for name, value in qualifiers)
+    return f"<GBFeature><GBFeature_key>{key}</GBFeature_key><GBFeature_quals>{quals}</GBFeature_quals></GBFeature>"
+
+def make_gbseq(n_extra_features, cds_qualifiers, with_gene=True, taxon='taxon:9606'):
+    features = [make_feature('source', [('organism', 'Homo sapiens'), ('db_xref', taxon)])]
+    features += [make_feature('Region', [('region_name', f'domain {i}'), ('note', 'x' * 40)]) for i in range(n_extra_features)]
+    if with_gene:
+        features.append(make_feature('gene', [('locus_tag', 'HS_001'), ('gene', 'CYCS')]))
+    features.append(make_feature('CDS', cds_qualifiers))
+    return (
+        "<GBSeq><GBSeq_accession-version>NP_000001.1</GBSeq_accession-version>"
+        f"<GBSeq_feature-table>{''.join(features)}</GBSeq_feature-table></GBSeq>"
+    )
+
+CASES = {
+    'coded_by': make_gbseq(20, [('gene', 'CYCS'), ('coded_by', 'NM_018947.6:71..388')]),
+    'refseq_xref': make_gbseq(20, [('db_xref', 'GeneID:54205'), ('db_xref', 'RefSeq:XM_011515.2')]),
+    'no_mrna': make_gbseq(20, [('note', 'no transcript')], with_gene=False),
+    'bad_taxon': make_gbseq(5, [('transcript_id', 'NM_1.1')], taxon='taxon:abc'),
+}
+
+def legacy_extract(seq_elem):
+    return (
+        extract_genbank_taxid(seq_elem),
+        extract_genbank_mrna(seq_elem),
+        extract_gene_name_from_features(seq_elem),
+    )
+
+def run(backend_name, backend, number=2000):
+    for case, xml in CASES.items():
+        seq_elem = backend.fromstring(xml.encode())
+        assert walk_genbank_features(seq_elem) == legacy_extract(seq_elem), case
+        
+        legacy = timeit.timeit(lambda: legacy_extract(seq_elem), number=number)
+        walker = timeit.timeit(lambda: walk_genbank_features(seq_elem), number=number)
+        print(
+            f"{backend_name:6} {case:12} legacy: {legacy / number * 1e6:7.1f} us  "
+            f"walker: {walker / number * 1e6:7.1f} us  speedup: {legacy / walker:4.1f}x"
+        )
+
+def run_batch(backend_name, backend, n_records=500, number=10):
+    """
+    End-to-end cost of parsing one EFetch batch with the given XML backend
+    """
+    record = CASES['coded_by'].replace(
+        '</GBSeq_accession-version>',
+        '</GBSeq_accession-version><GBSeq_definition>cytochrome c [Homo sapiens]</GBSeq_definition>'
+        f"<GBSeq_sequence>{'mgdvekgkkifvqkcaqchtvekggkhktgpnlhglfgrktgqa' * 10}</GBSeq_sequence>"
+    )
+    xml_content = f"<GBSet>{record * n_records}</GBSet>".encode()
+    
+    ncbi.XML_BACKEND = backend
+    elapsed = timeit.timeit(lambda: parse_genbank_proteins(xml_content), number=number)
+    print(f"{backend_name:6} parse_genbank_proteins ({n_records} records): {elapsed / number * 1e3:7.1f} ms")
+
+if __name__ == '__main__':
+    run('etree', ET)
+    if lxml_etree is not None:
+        run('lxml', lxml_etree)
+    
+    run_batch('etree', ET)
+    if lxml_etree is not None:
+        run_batch('lxml', lxml_etree)
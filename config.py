@@ -1,4 +1,5 @@
 # Global configuration
+import os
 
 # Interface colors
 VIOLET_COLOR = "#654DF0"
@@ -7,6 +8,88 @@ VIOLET_HOVER = "#5B45D9"
 # API Configuration
 API_BASE_URL = "http://134.158.151.55"
 
+# Upstream services
+UNIPROT_REST_URL = "https://rest.uniprot.org"
+UNIPROT_PAGE_SIZE = 500  # Entries per page of a UniProtKB search
+UNIPROT_MAX_CONCURRENT_REQUESTS = 4
+UNIPROT_LEAN_PROJECTION = True  # Search without EMBL cross-references, mRNA looked up when first needed
+UNIPROT_ACCESSIONS_BATCH_SIZE = 200  # Entries per /uniprotkb/accessions request
+UNIPROT_LOCAL_FASTA = True  # Fetch the sequences of the selected entries and build the UniProt FASTA locally
+UNIPROT_TAXONOMY_BATCH_SIZE = 100  # Taxids per OR-combined taxonomy query
+UNIPROT_PARTITIONED_FETCH = True  # Fetch large UniProtKB searches as length slices in parallel
+UNIPROT_PARTITION_MIN_RESULTS = 2000  # Smaller searches are paged serially
+UNIPROT_PARTITIONS = 4  # Slices fetched concurrently
+UNIPROT_PARTITION_LENGTH_EDGES = (1, 100, 200, 300, 400, 500, 700, 1000, 1500)  # Buckets counted to size the slices
+
+# Pooled HTTP connections (see http_clients.py)
+HTTP_MAX_CONNECTIONS = 20
+HTTP_MAX_KEEPALIVE_CONNECTIONS = 10
+HTTP_KEEPALIVE_EXPIRY = 30  # seconds
+
+# Request rate, shared by every request and session of the process (see rate_limit.py)
+NCBI_API_KEY = os.environ.get('NCBI_API_KEY')
+NCBI_EMAIL = os.environ.get('NCBI_EMAIL', 'your.email@example.com')
+NCBI_REQUESTS_PER_SECOND = 10 if NCBI_API_KEY else 3  # NCBI limits
+UNIPROT_REQUESTS_PER_SECOND = 10
+HTTP_MAX_RETRIES = 4  # On 429, 5xx and connection errors
+
+# NCBI E-utilities
+NCBI_EUTILS_URL = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils"
+NCBI_MAX_CONCURRENT_REQUESTS = 4
+NCBI_EFETCH_WINDOW_SIZE = 500  # Records per EFetch request when paging the History server
+NCBI_ACCESSION_WINDOW_SIZE = 10000  # Accessions listed per EFetch rettype=acc request
+NCBI_ESUMMARY_PREFILTER = True  # Check names on ESummary docsums before fetching full records
+NCBI_ESUMMARY_WINDOW_SIZE = 5000  # Docsums per ESummary request
+SKIP_UNIPROT_COVERED_NCBI = True  # Drop NCBI proteins cross-referenced by the UniProtKB results
+USE_LXML = False  # Parse GenBank XML with lxml when installed (see benchmark_genbank_features.py)
+
+# Local NCBI taxonomy, used by fetch_taxonomy and fetch_ranks when present (see taxonomy_index.py)
+# nodes.dmp and names.dmp from https://ftp.ncbi.nlm.nih.gov/pub/taxonomy/taxdump.tar.gz
+TAXONOMY_INDEX_ENABLED = True
+TAXDUMP_DIR = "cache/taxdump"
+TAXONOMY_SNAPSHOT_PATH = "cache/taxonomy_index.bin"
+
+# Ancestors at a rank resolved through UniProt, shared by every session and kept across restarts
+LINEAGE_CACHE_ENABLED = True
+LINEAGE_CACHE_PATH = "cache/lineages.sqlite3"
+LINEAGE_CACHE_TTL = 90 * 24 * 3600  # seconds
+LINEAGE_CACHE_MAX_ENTRIES = 500000
+
+# Local cache of parsed NCBI records, keyed by accession.version
+RECORD_CACHE_ENABLED = True
+RECORD_CACHE_PATH = "cache/ncbi_records.sqlite3"
+RECORD_CACHE_TTL = 7 * 24 * 3600  # seconds
+RECORD_CACHE_MAX_BYTES = 512 * 1024 * 1024
+
+# Checkpoints of running NCBI searches, so that interrupted searches can resume
+SEARCH_CHECKPOINT_DIR = "cache/checkpoints"
+SEARCH_CHECKPOINT_TTL = 24 * 3600  # seconds
+NCBI_HISTORY_TTL = 3600  # seconds a saved WebEnv is reused before running ESearch again
+
+# Sequences of the searches and sessions, spilled to a memory-mapped file past the memory budget (see sequence_store.py)
+SEQUENCE_STORE_DIR = "cache/sequences"
+SEQUENCE_STORE_MEMORY_BUDGET = 64 * 1024 * 1024
+
+# Searches are planned from their hit counts before fetching (see search_plan.py)
+SEARCH_PLAN_CONFIRM_HITS = 5000  # Hits in one source above which the search asks for confirmation
+SEARCH_PLAN_CONFIRM_SECONDS = 120  # Estimated duration above which the search asks for confirmation
+SEARCH_PLAN_DEFAULT_CAP = 1000  # Results per source offered when capping a large search
+SEARCH_PLAN_BANDWIDTH = 2 * 1024 * 1024  # bytes per second, for the duration estimate
+UNIPROT_ENTRY_BYTES = 2500  # Average size of the downloaded records, for the estimates
+NCBI_SUMMARY_BYTES = 1500
+NCBI_PROTEIN_RECORD_BYTES = 12000
+NCBI_MRNA_RECORD_BYTES = 25000
+
+# Results of recent searches, shared by the sessions running the same search (see search_cache.py)
+SEARCH_RESULT_CACHE_TTL = 6 * 3600  # seconds
+SEARCH_RESULT_CACHE_SIZE = 32  # searches
+
+# Identical sequences of the same taxid are sent once to FASTA creation
+DEDUPLICATE_SEQUENCES = True
+
+# Search results are shown batch by batch, the counts and histogram redrawn at most this often
+RESULTS_REFRESH_INTERVAL = 1.0  # seconds
+
 
 # Global variables shared between modules
 current_url = None
@@ -35,7 +118,8 @@ search_params = {
     'term': None,
     'taxid': None,
     'uniprot': True,
-    'ncbi': True
+    'ncbi': True,
+    'metadata_only': False  # NCBI sequences are fetched only for the final selection
 }
 
 selection_params = {
@@ -46,21 +130,22 @@ selection_params = {
 }
 
 current_search_type = None  # 'protein' or 'gene'
-all_proteins = []
-uniprot_proteins = []
-ncbi_proteins = []
+all_proteins = None  # ResultStore of UniProtKB and NCBI proteins, set by each search (see result_store.py)
 
-ncbi_genes = []
+ncbi_genes = None  # ResultStore
 
 selected_data = []
 
 # Custom FASTA upload variables
 select_sequence_active_tab = 'sequences_from_search'  # 'sequences_from_search' or 'custom_fasta'
-custom_fasta_content = None  # Content of uploaded custom FASTA file
+custom_fasta_content = None  # Sequence store reference to the content of the uploaded custom FASTA file
 custom_fasta_filename = None  # Filename of uploaded custom FASTA file
 
 use_mrna_from_proteins_button = None
 
+# Result tables filled while a search runs (see protein_gene_table.py)
+result_tables = {}
+
 # UI containers (initialized in main.py)
 uniprot_table_container = None
 sequence_selection_container = None
@@ -0,0 +1,69 @@
+import asyncio
+import httpx
+import config
+
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+# Default timeout (seconds) per upstream, individual calls can override it
+UPSTREAM_TIMEOUTS = {
+    'ncbi': 60,
+    'uniprot': 120,
+    'pipeline': 5,
+}
+
+async_clients = {}
+sync_clients = {}
+
+def client_options(upstream):
+    """
+    Keep-alive pooled connections, gzip (httpx default Accept-Encoding) and
+    HTTP/2 when the h2 package is installed and the server negotiates it
+    """
+    if upstream not in UPSTREAM_TIMEOUTS:
+        raise ValueError(f"Unknown upstream '{upstream}'")
+    return {
+        'timeout': UPSTREAM_TIMEOUTS[upstream],
+        'limits': httpx.Limits(
+            max_connections=config.HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=config.HTTP_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=config.HTTP_KEEPALIVE_EXPIRY
+        ),
+        'http2': HTTP2_AVAILABLE,
+        'headers': {'User-Agent': 'EvoTree'},
+    }
+
+def get_async_client(upstream):
+    """
+    Return the long-lived AsyncClient for 'ncbi', 'uniprot' or 'pipeline'
+    A client is bound to the event loop it was created in
+    """
+    loop = asyncio.get_running_loop()
+    entry = async_clients.get(upstream)
+    if entry is None or entry[1] is not loop or entry[0].is_closed:
+        entry = (httpx.AsyncClient(**client_options(upstream)), loop)
+        async_clients[upstream] = entry
+    return entry[0]
+
+def get_sync_client(upstream):
+    """
+    Return the long-lived Client for 'ncbi', 'uniprot' or 'pipeline', for code
+    running in worker threads
+    """
+    client = sync_clients.get(upstream)
+    if client is None or client.is_closed:
+        client = httpx.Client(**client_options(upstream))
+        sync_clients[upstream] = client
+    return client
+
+async def close_clients():
+    for client, _ in async_clients.values():
+        await client.aclose()
+    async_clients.clear()
+
+    for client in sync_clients.values():
+        client.close()
+    sync_clients.clear()
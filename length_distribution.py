@@ -2,21 +2,14 @@ from nicegui import ui
 import numpy as np
 import config
 
-def get_sequence_length(item):
-    return item.get('sequence_length', 0)
-
 def create_length_distribution_chart(data_items, user_min_length=None, user_max_length=None):
     if user_min_length == '*':
         user_min_length = None
     if user_max_length == '*':
         user_max_length = None
     
-    # Extract lengths using the new unified function
-    lengths = []
-    for item in data_items:
-        length = get_sequence_length(item)
-        if length and length > 0:
-            lengths.append(length)
+    # Read the length column of the results directly
+    lengths = [length for length in data_items.lengths if length > 0] if data_items else []
     
     if not lengths:
         data_type = "genes" if config.current_search_type == 'gene' else "proteins"
@@ -0,0 +1,138 @@
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+import config
+
+class LineageCache:
+    """
+    Ancestors at a rank, (taxid, rank) -> (ancestor taxid, ancestor name),
+    shared by every search and session of the process
+    Entries are held in memory in least recently used order and written
+    through to SQLite, so that they survive restarts. Both are bounded to
+    `max_entries`, entries older than `ttl` seconds are treated as missing
+    """
+    # SQLite limits the number of host parameters per statement
+    query_chunk_size = 500
+
+    def __init__(self, path, ttl, max_entries):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()  # (taxid, rank) -> (ancestor taxid, ancestor name, created)
+        self.touched = set()  # Keys read since the last write, their access time is updated with it
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        with self.connection:
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS lineages ("
+                "taxid INTEGER NOT NULL, rank TEXT NOT NULL, ancestor_taxid INTEGER NOT NULL, "
+                "ancestor_name TEXT NOT NULL, created REAL NOT NULL, accessed REAL NOT NULL, "
+                "PRIMARY KEY (taxid, rank))"
+            )
+            self.connection.execute("CREATE INDEX IF NOT EXISTS lineages_accessed ON lineages (accessed)")
+
+    def warm(self):
+        """
+        Load the most recently used entries that are still fresh
+        """
+        with self.lock, self.connection:
+            self.evict(time.time())
+            rows = self.connection.execute(
+                "SELECT taxid, rank, ancestor_taxid, ancestor_name, created FROM lineages ORDER BY accessed DESC LIMIT ?",
+                (self.max_entries,)
+            ).fetchall()
+            # Oldest first, so that the most recent end up last in LRU order
+            for taxid, rank, ancestor_taxid, ancestor_name, created in reversed(rows):
+                self.entries[(taxid, rank)] = (ancestor_taxid, ancestor_name, created)
+        print(f"Lineage cache warmed ({len(self.entries)} entries)")
+
+    def get_many(self, taxids, rank):
+        """
+        Return {taxid: (ancestor taxid, ancestor name)} for the taxids found
+        """
+        found = {}
+        expired = time.time() - self.ttl
+        with self.lock:
+            for taxid in taxids:
+                key = (taxid, rank)
+                entry = self.entries.get(key)
+                if entry is None:
+                    continue
+                ancestor_taxid, ancestor_name, created = entry
+                if created < expired:
+                    # Also deleted from SQLite by the next evict
+                    del self.entries[key]
+                    self.touched.discard(key)
+                    continue
+                self.entries.move_to_end(key)
+                self.touched.add(key)
+                found[taxid] = (ancestor_taxid, ancestor_name)
+        return found
+
+    def put_many(self, rank, ancestors):
+        """
+        Store {taxid: (ancestor taxid, ancestor name)}, unresolved ancestors
+        (None) are left out
+        """
+        rows = [
+            (taxid, rank, ancestor_taxid, ancestor_name)
+            for taxid, (ancestor_taxid, ancestor_name) in ancestors.items()
+            if ancestor_taxid is not None
+        ]
+        if not rows:
+            return
+
+        now = time.time()
+        with self.lock, self.connection:
+            for taxid, _, ancestor_taxid, ancestor_name in rows:
+                self.entries[(taxid, rank)] = (ancestor_taxid, ancestor_name, now)
+                self.entries.move_to_end((taxid, rank))
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO lineages (taxid, rank, ancestor_taxid, ancestor_name, created, accessed) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                [(*row, now, now) for row in rows]
+            )
+            touched = list(self.touched)
+            self.touched = set()
+            for i in range(0, len(touched), self.query_chunk_size):
+                self.connection.executemany(
+                    "UPDATE lineages SET accessed = ? WHERE taxid = ? AND rank = ?",
+                    [(now, taxid, touched_rank) for taxid, touched_rank in touched[i:i + self.query_chunk_size]]
+                )
+            self.evict(now)
+
+    def evict(self, now):
+        """
+        Drop expired entries, then the least recently used ones beyond max_entries
+        """
+        self.connection.execute("DELETE FROM lineages WHERE created < ?", (now - self.ttl,))
+        self.connection.execute(
+            "DELETE FROM lineages WHERE rowid IN ("
+            "SELECT rowid FROM lineages ORDER BY accessed DESC, rowid DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,)
+        )
+
+lineage_cache = None
+lineage_cache_lock = threading.Lock()
+
+def get_lineage_cache():
+    """
+    Return the process-wide lineage cache, warmed on first use, or None when
+    caching is disabled
+    """
+    global lineage_cache
+    if not config.LINEAGE_CACHE_ENABLED:
+        return None
+    with lineage_cache_lock:
+        if lineage_cache is None:
+            lineage_cache = LineageCache(config.LINEAGE_CACHE_PATH, config.LINEAGE_CACHE_TTL, config.LINEAGE_CACHE_MAX_ENTRIES)
+            lineage_cache.warm()
+    return lineage_cache
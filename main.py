@@ -1,35 +1,32 @@
-from nicegui import ui
-import requests
+import asyncio
+from nicegui import ui, app
 from datetime import datetime
 import config
 import styles
+from http_clients import get_sync_client, close_clients
+from sequence_store import close_sequence_store
+from lineage_cache import get_lineage_cache
+from taxonomy_index import get_taxonomy_index
 from search import search_protein, search_genes
-from protein_gene_table import create_protein_table, create_gene_table
-from sequence_selection import show_sequence_selection_form
 
 with ui.row().classes('w-full justify-center mb-4'):
     ui.label('EvoTree').style(f'color: {config.VIOLET_COLOR}; font-size: 2rem; font-weight: bold; text-align: center;')
 
 
-async def handle_search_proteins(protein_name, taxonomy_name, selected_rank):
+async def handle_search_proteins(protein_name, taxonomy_name, selected_rank, metadata_only):
     if not protein_name.strip():
         ui.notify('Please enter a protein name.', color='warning')
         return
     
-    result = await search_protein(protein_name, taxonomy_name, selected_rank)
-    if result and result['success']:
-        create_protein_table()
-        show_sequence_selection_form()
+    # Results tables and sequence selection are filled in by the search as batches arrive
+    await search_protein(protein_name, taxonomy_name, selected_rank, metadata_only)
 
-async def handle_search_genes(gene_name, taxonomy_name, selected_rank):
+async def handle_search_genes(gene_name, taxonomy_name, selected_rank, metadata_only):
     if not gene_name.strip():
         ui.notify('Please enter a gene name.', color='warning')
         return
     
-    result = await search_genes(gene_name, taxonomy_name, selected_rank)
-    if result and result['success']:
-        create_gene_table()
-        show_sequence_selection_form()
+    await search_genes(gene_name, taxonomy_name, selected_rank, metadata_only)
 
 
 with ui.card().classes(f'w-full border-2 border-[{config.VIOLET_COLOR}] rounded-xl shadow-lg p-6'):
@@ -41,6 +38,8 @@ with ui.card().classes(f'w-full border-2 border-[{config.VIOLET_COLOR}] rounded-
             label='Rank',
             value='species'
         ).classes('flex-grow')
+        metadata_only_switch = ui.switch('Metadata only', value=config.search_params['metadata_only'])
+        metadata_only_switch.tooltip('Fetch NCBI sequences only for the final selection')
     
     with ui.row().classes('w-full gap-4'):
         search_proteins_button = ui.button(
@@ -48,7 +47,8 @@ with ui.card().classes(f'w-full border-2 border-[{config.VIOLET_COLOR}] rounded-
             on_click=lambda: handle_search_proteins(
                 input_name.value,
                 taxonomy_input.value,
-                rank_select.value
+                rank_select.value,
+                metadata_only_switch.value
             )
         ).classes('flex-1')
         styles.apply_violet_color(search_proteins_button)
@@ -58,7 +58,8 @@ with ui.card().classes(f'w-full border-2 border-[{config.VIOLET_COLOR}] rounded-
             on_click=lambda: handle_search_genes(
                 input_name.value,
                 taxonomy_input.value,
-                rank_select.value
+                rank_select.value,
+                metadata_only_switch.value
             )
         ).classes('flex-1')
         styles.apply_violet_color(search_genes_button)
@@ -90,10 +91,22 @@ config.loading_spinner.set_visibility(False)
 
 
 clear_flask = ui.button('Clear Flask TMP',
-          on_click=lambda: requests.post(f"{config.API_BASE_URL}/clear", json={"date_limit": datetime.now().strftime("%d%m%Y%H%M%S")})).classes('mt-20')
+          on_click=lambda: get_sync_client('pipeline').post(f"{config.API_BASE_URL}/clear", json={"date_limit": datetime.now().strftime("%d%m%Y%H%M%S")})).classes('mt-20')
 styles.apply_default_color(clear_flask)
 styles.apply_full_width(clear_flask)
 
+async def warm_taxonomy_index():
+    """
+    Load (or build from the taxdump) the local taxonomy in the background at
+    startup, searches started meanwhile wait for it under its lock
+    """
+    asyncio.get_running_loop().run_in_executor(None, get_taxonomy_index)
+
+app.on_startup(get_lineage_cache)
+app.on_startup(warm_taxonomy_index)
+app.on_shutdown(close_clients)
+app.on_shutdown(close_sequence_store)
+
 # ui.run(port=8080, show=True, reload=True)
 
 if __name__ in {"__main__", "__mp_main__"}:
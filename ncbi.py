@@ -1,146 +1,131 @@
-import requests
+import asyncio
+import json
 import xml.etree.ElementTree as ET
-import time
-import httpx
 import re
+import time
 from datetime import datetime
+import config
+from http_clients import get_async_client
+from rate_limit import ncbi_governor, governed_request, governed_stream
+from record_cache import get_record_cache
+from search_checkpoint import SearchCheckpoint
+from result_store import record_from_ncbi
 
-def ncbi_esearch(query, database, start=0, max_results=500):
-    base_url = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils/esearch.fcgi"
-    params = {
-        'db': database,
-        'term': query,
-        'retstart': start,
-        'retmax': max_results,
-        'retmode': 'xml',
-        'email': 'your.email@example.com'
-    }
-    
-    try:
-        response = requests.get(base_url, params=params, timeout=30)
-        response.raise_for_status()
-        return response.content
-    except Exception as e:
-        print(f"Error in ESearch {database}: {e}")
-        return None
+try:
+    from lxml import etree as lxml_etree
+except ImportError:
+    lxml_etree = None
 
-def ncbi_esearch_count(query, database):
-    base_url = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils/esearch.fcgi"
-    params = {
-        'db': database,
-        'term': query,
-        'rettype': 'count',
-        'retmode': 'xml',
-        'email': 'your.email@example.com'
-    }
-    
-    try:
-        response = requests.get(base_url, params=params, timeout=30)
-        response.raise_for_status()
-        return response.content
-    except Exception as e:
-        print(f"Error getting {database} count: {e}")
-        return None
-    
-def ncbi_efetch_mrna_genbank(mrna_ids):
+# lxml is optional: it parses GenBank XML faster but the standard library
+# ElementTree is used when it is not installed
+XML_BACKEND = lxml_etree if lxml_etree is not None and config.USE_LXML else ET
+
+# =============================================================================
+# XML PARSING FUNCTIONS
+# =============================================================================
+
+def parse_esearch_count(xml_content):
     """
-    Retrieve mRNA details in GenBank format from Nucleotide database
+    Extract result count from ESearch
     """
-    base_url = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils/efetch.fcgi"
-    params = {
-        'db': 'nucleotide',
-        'id': ','.join(mrna_ids),
-        'rettype': 'gb',
-        'retmode': 'xml',
-        'tool': 'evotree',
-        'email': 'your.email@example.com'
-    }
+    if not xml_content:
+        return 0
     
     try:
-        response = requests.get(base_url, params=params, timeout=60)
-        response.raise_for_status()
-        return response.content
+        root = ET.fromstring(xml_content)
+        count = int(root.findtext('.//Count', '0'))
+        return count
     except Exception as e:
-        print(f"Error in EFetch mRNA GenBank: {e}")
-        return None
+        print(f"Error parsing count: {e}")
+        return 0
 
-def ncbi_efetch_proteins_genbank(protein_ids):
+def parse_esearch_history(xml_content):
     """
-    Retrieve protein details in GenBank format
+    Extract result count, WebEnv and query_key from a usehistory=y ESearch
     """
-    base_url = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils/efetch.fcgi"
-    params = {
-        'db': 'protein',
-        'id': ','.join(protein_ids),
-        'rettype': 'gb',
-        'retmode': 'xml',
-        'tool': 'evotree',
-        'email': 'your.email@example.com'
-    }
+    if not xml_content:
+        return 0, None, None
     
     try:
-        response = requests.get(base_url, params=params, timeout=60)
-        response.raise_for_status()
-        return response.content
+        root = ET.fromstring(xml_content)
+        count = int(root.findtext('Count', '0'))
+        return count, root.findtext('WebEnv'), root.findtext('QueryKey')
     except Exception as e:
-        print(f"Error in EFetch proteins: {e}")
-        return None
+        print(f"Error parsing ESearch history: {e}")
+        return 0, None, None
 
-def ncbi_efetch_proteins_fasta(protein_ids):
+class GenBankStreamParser:
     """
-    Retrieve protein details in FASTA format
+    Incremental GBSet parser: raw bytes are fed as they arrive and one record
+    is extracted per completed GBSeq, which is then cleared so that only the
+    record being parsed is held in memory
     """
-    base_url = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils/efetch.fcgi"
-    params = {
-        'db': 'protein',
-        'id': ','.join(protein_ids),
-        'rettype': 'fasta',
-        'retmode': 'xml',
-        'tool': 'evotree',
-        'email': 'your.email@example.com'
-    }
-    
-    try:
-        response = requests.get(base_url, params=params, timeout=60)
-        response.raise_for_status()
-        return response.content
-    except Exception as e:
-        print(f"Error in EFetch FASTA: {e}")
-        return None
+    def __init__(self, extract_function):
+        self.extract_function = extract_function
+        self.is_lxml = XML_BACKEND is not ET
+        if self.is_lxml:
+            # lxml filters events by tag in C and can detach processed elements
+            self.parser = XML_BACKEND.XMLPullParser(events=('end',), tag='GBSeq')
+        else:
+            self.parser = ET.XMLPullParser(events=('end',))
 
-# =============================================================================
-# XML PARSING FUNCTIONS
-# =============================================================================
+    def feed(self, data):
+        self.parser.feed(data)
+        return self.read_records()
+
+    def close(self):
+        self.parser.close()
+        return self.read_records()
+
+    def read_records(self):
+        records = []
+        for _, elem in self.parser.read_events():
+            if elem.tag != 'GBSeq':
+                continue
+            record = self.extract_function(elem)
+            if record:
+                records.append(record)
+            elem.clear()
+            if self.is_lxml and elem.getparent() is not None:
+                elem.getparent().remove(elem)
+        return records
 
-def parse_esearch_ids(xml_content):
+def iter_genbank_records(xml_content, extract_function, chunk_size=65536):
     """
-    Extract IDs from an ESearch result
+    Yield one extracted record per GBSeq of a GenBank XML document
+    """
+    parser = GenBankStreamParser(extract_function)
+    for i in range(0, len(xml_content), chunk_size):
+        yield from parser.feed(xml_content[i:i + chunk_size])
+    yield from parser.close()
+
+def parse_epost_history(xml_content):
+    """
+    Extract WebEnv and query_key from an EPost result
     """
     if not xml_content:
-        return []
+        return None, None
     
     try:
         root = ET.fromstring(xml_content)
-        ids = [id_elem.text for id_elem in root.findall('.//Id')]
-        return ids
+        return root.findtext('WebEnv'), root.findtext('QueryKey')
     except Exception as e:
-        print(f"Error parsing ESearch IDs: {e}")
-        return []
+        print(f"Error parsing EPost result: {e}")
+        return None, None
 
-def parse_esearch_count(xml_content):
+def parse_esummary_docsums(json_content):
     """
-    Extract result count from ESearch
+    Extract the document summaries of a JSON ESummary result, in UID order
     """
-    if not xml_content:
-        return 0
+    if not json_content:
+        return []
     
     try:
-        root = ET.fromstring(xml_content)
-        count = int(root.findtext('.//Count', '0'))
-        return count
+        result = json.loads(json_content).get('result', {})
+        return [result[uid] for uid in result.get('uids', []) if uid in result]
     except Exception as e:
-        print(f"Error parsing count: {e}")
-        return 0
+        print(f"Error parsing ESummary: {e}")
+        return []
 
 def parse_genbank_proteins(xml_content):
     """
@@ -151,42 +136,14 @@ def parse_genbank_proteins(xml_content):
     
     proteins = []
     try:
-        root = ET.fromstring(xml_content)
-        seq_elements = root.findall('.//GBSeq')
-        
-        for seq_elem in seq_elements:
-            protein = extract_genbank_protein_info(seq_elem)
-            if protein:
-                proteins.append(protein)
+        for protein in iter_genbank_records(xml_content, extract_genbank_protein_info):
+            proteins.append(protein)
                 
     except Exception as e:
         print(f"Error parsing GenBank proteins: {e}")
     
     return proteins
 
-def parse_genbank_mrna(xml_content):
-    """
-    Parse mRNA sequences from GenBank XML (Nucleotide database)
-    Filters to keep only mRNA sequences
-    """
-    if not xml_content:
-        return []
-    
-    mrna_sequences = []
-    try:
-        root = ET.fromstring(xml_content)
-        seq_elements = root.findall('.//GBSeq')
-        
-        for seq_elem in seq_elements:
-            mrna = extract_genbank_mrna_info(seq_elem)
-            if mrna:
-                mrna_sequences.append(mrna)
-                
-    except Exception as e:
-        print(f"Error parsing GenBank mRNA: {e}")
-    
-    return mrna_sequences
-
 # =============================================================================
 # DATA EXTRACTION FUNCTIONS
 # =============================================================================
@@ -201,14 +158,9 @@ def extract_genbank_protein_info(seq_elem):
         scientific_name = seq_elem.findtext('GBSeq_organism', None)
         definition = seq_elem.findtext('GBSeq_definition', '')
         sequence = seq_elem.findtext('GBSeq_sequence', '').upper()
-        
-        if '[' in definition:
-            protein_name = definition.split('[')[0].strip()
-        else:
-            protein_name = definition.strip()
+        protein_name = protein_name_from_definition(definition)
 
-        taxid = extract_genbank_taxid(seq_elem)
-        mrna_id = extract_genbank_mrna(seq_elem)
+        taxid, mrna_id, _ = walk_genbank_features(seq_elem)
         
         return {
             'accession': accession,
@@ -236,10 +188,7 @@ def extract_genbank_mrna_info(seq_elem):
         definition = seq_elem.findtext('GBSeq_definition', '')
         sequence = seq_elem.findtext('GBSeq_sequence', '').upper()
         taxid = extract_genbank_taxid(seq_elem)
-        if definition.endswith(', mRNA'):
-            gene_name = definition[:-6].strip()
-        else:
-            gene_name = definition.strip()
+        gene_name = mrna_gene_name_from_definition(definition)
 
         return {
             'accession': accession,
@@ -255,6 +204,53 @@ def extract_genbank_mrna_info(seq_elem):
         print(f"Error extracting GenBank mRNA: {e}")
         return None
 
+def protein_name_from_definition(definition):
+    """
+    Protein name from a GenPept definition or docsum title, without the [organism] suffix
+    """
+    if '[' in definition:
+        return definition.split('[')[0].strip()
+    return definition.strip()
+
+def mrna_gene_name_from_definition(definition):
+    """
+    Gene name from a Nucleotide mRNA definition or docsum title, without the ', mRNA' suffix
+    """
+    if definition.endswith(', mRNA'):
+        return definition[:-6].strip()
+    return definition.strip()
+
+def protein_record_from_docsum(docsum):
+    """
+    Metadata-only protein record from an ESummary docsum, without sequence or mRNA
+    """
+    taxid = str(docsum.get('taxid', ''))
+    return {
+        'accession': docsum.get('accessionversion', 'Unknown'),
+        'protein_name': protein_name_from_definition(docsum.get('title', '')),
+        'sequence': None,
+        'scientific_name': docsum.get('organism'),
+        'taxid': int(taxid) if taxid.isdigit() and taxid != '0' else 'N/A',
+        'sequence_length': int(docsum.get('slen', 0) or 0),
+        'mRNA': None,
+        'database': 'NCBI'
+    }
+
+def mrna_record_from_docsum(docsum):
+    """
+    Metadata-only mRNA record from an ESummary docsum, without sequence
+    """
+    taxid = str(docsum.get('taxid', ''))
+    return {
+        'accession': docsum.get('accessionversion', 'Unknown'),
+        'gene_name': mrna_gene_name_from_definition(docsum.get('title', '')),
+        'sequence': None,
+        'scientific_name': docsum.get('organism'),
+        'taxid': int(taxid) if taxid.isdigit() and taxid != '0' else 'N/A',
+        'sequence_length': int(docsum.get('slen', 0) or 0),
+        'database': 'NCBI'
+    }
+
 def extract_gene_name_from_definition(definition):
     """
     Extract gene name from sequence definition
@@ -359,6 +355,65 @@ def extract_genbank_mrna(seq_elem):
     
     return None
 
+def walk_genbank_features(seq_elem):
+    """
+    Extract taxid, mRNA ID and gene name in a single pass over the feature table
+    Returns the same values as extract_genbank_taxid, extract_genbank_mrna and
+    extract_gene_name_from_features (first match of each, in document order)
+    """
+    taxid = 'N/A'
+    mrna_id = None
+    gene_name = None
+    found_taxid = found_mrna = found_gene = False
+    
+    try:
+        for feature in seq_elem.iter('GBFeature'):
+            key = feature.findtext('GBFeature_key', '')
+            
+            if key == 'source' and not found_taxid:
+                for qualifier in feature.iter('GBQualifier'):
+                    qual_name = qualifier.findtext('GBQualifier_name', '')
+                    qual_value = qualifier.findtext('GBQualifier_value', '')
+                    
+                    if qual_name == 'db_xref' and 'taxon:' in qual_value:
+                        taxid_str = qual_value.replace('taxon:', '')
+                        if taxid_str.isdigit():
+                            taxid = int(taxid_str)
+                            found_taxid = True
+                            break
+            
+            elif key == 'CDS' and not found_mrna:
+                for qualifier in feature.iter('GBQualifier'):
+                    qual_name = qualifier.findtext('GBQualifier_name', '')
+                    qual_value = qualifier.findtext('GBQualifier_value', '')
+                    
+                    if qual_name in ['transcript_id', 'coded_by']:
+                        mrna_id = extract_mrna_id_from_text(qual_value)
+                        if mrna_id:
+                            found_mrna = True
+                            break
+                    
+                    elif qual_name == 'db_xref' and 'RefSeq:' in qual_value:
+                        refseq_id = qual_value.replace('RefSeq:', '')
+                        if refseq_id.startswith(('NM_', 'XM_')):
+                            mrna_id = refseq_id.split('.')[0]
+                            found_mrna = True
+                            break
+            
+            elif key == 'gene' and not found_gene:
+                for qualifier in feature.iter('GBQualifier'):
+                    if qualifier.findtext('GBQualifier_name', '') == 'gene':
+                        gene_name = qualifier.findtext('GBQualifier_value', '')
+                        found_gene = True
+                        break
+            
+            if found_taxid and found_mrna and found_gene:
+                break
+    except Exception as e:
+        print(f"Error walking GenBank features: {e}")
+    
+    return taxid, mrna_id, gene_name
+
 def extract_mrna_id_from_text(text):
     """
     Extract mRNA ID from text using regex
@@ -393,136 +448,536 @@ def build_mrna_query(gene_name, taxid=None):
     return " AND ".join(query)
 
 # =============================================================================
-# HIGH-LEVEL ORCHESTRATION FUNCTIONS
+# ASYNC FETCH ENGINE
 # =============================================================================
 
-def search_proteins_by_name(protein_name, taxid=None, max_results=None):
-    query = build_protein_query(protein_name, taxid)
-    # Count first
-    count_xml = ncbi_esearch_count(query, database='protein')
-    total_count = parse_esearch_count(count_xml)
-    if total_count == 0:
-        return []
+def with_api_key(params):
+    """
+    Add the NCBI API key, when configured, to E-utilities parameters
+    """
+    if config.NCBI_API_KEY:
+        return {**params, 'api_key': config.NCBI_API_KEY}
+    return params
+
+async def async_ncbi_get(client, endpoint, params, timeout=60):
+    response = await governed_request(
+        client, ncbi_governor, 'GET', f"{config.NCBI_EUTILS_URL}/{endpoint}", params=with_api_key(params), timeout=timeout
+    )
+    response.raise_for_status()
+    return response.content
+
+async def async_ncbi_stream_records(client, endpoint, params, extract_function, timeout=120, method='GET'):
+    """
+    Stream a GenBank XML response through GenBankStreamParser as it downloads
+    POST sends the parameters in the body, for long ID lists
+    """
+    async def consume(response):
+        parser = GenBankStreamParser(extract_function)
+        records = []
+        async for chunk in response.aiter_bytes():
+            records.extend(parser.feed(chunk))
+        records.extend(parser.close())
+        return records
     
-    # Use all results if max_results is None, otherwise limit
-    actual_max = total_count if max_results is None else min(total_count, max_results)
-    print(f"Found {total_count} proteins, retrieving {actual_max}...")
+    params = with_api_key(params)
+    url = f"{config.NCBI_EUTILS_URL}/{endpoint}"
+    if method == 'POST':
+        return await governed_stream(client, ncbi_governor, 'POST', url, consume, data=params, timeout=timeout)
+    return await governed_stream(client, ncbi_governor, 'GET', url, consume, params=params, timeout=timeout)
+
+async def async_ncbi_epost(client, database, ids):
+    """
+    Upload a list of UIDs or accessions to the History server
+    """
+    params = {
+        'db': database,
+        'id': ','.join(ids),
+        'tool': 'evotree',
+        'email': config.NCBI_EMAIL
+    }
     
-    # Retrieve IDs in batches
-    all_proteins = []
-    search_batch_size = 500  # For ESearch
-    efetch_batch_size = 50   # Smaller batches for EFetch to avoid URI too long error
+    try:
+        response = await governed_request(
+            client, ncbi_governor, 'POST', f"{config.NCBI_EUTILS_URL}/epost.fcgi", data=with_api_key(params), timeout=120
+        )
+        response.raise_for_status()
+        return response.content
+    except Exception as e:
+        print(f"Error in EPost {database}: {e}")
+        return None
+
+async def async_ncbi_esearch_history(client, query, database):
+    """
+    Run an ESearch query once and store its result set on the History server
+    """
+    params = {
+        'db': database,
+        'term': query,
+        'usehistory': 'y',
+        'retmax': 0,
+        'retmode': 'xml',
+        'email': config.NCBI_EMAIL
+    }
     
-    for start in range(0, actual_max, search_batch_size):
-        current_batch = min(search_batch_size, actual_max - start)
-        
-        # Search for IDs
-        search_xml = ncbi_esearch(query, 'protein', start, current_batch)
-        protein_ids = parse_esearch_ids(search_xml)
-        
-        if protein_ids:
-            # Process IDs in smaller chunks for EFetch
-            for i in range(0, len(protein_ids), efetch_batch_size):
-                chunk_ids = protein_ids[i:i + efetch_batch_size]
-                
-                # Retrieve details for this chunk
-                details_xml = ncbi_efetch_proteins_genbank(chunk_ids)
-                proteins = parse_genbank_proteins(details_xml)
+    try:
+        return await async_ncbi_get(client, 'esearch.fcgi', params, timeout=30)
+    except Exception as e:
+        print(f"Error in ESearch {database}: {e}")
+        return None
 
-                relevant_proteins = [p for p in proteins if is_query_in_name(protein_name, p['protein_name'])]
+async def async_ncbi_esearch_count(client, query, database):
+    """
+    Number of entries an ESearch query matches, or None if unknown
+    """
+    params = {
+        'db': database,
+        'term': query,
+        'rettype': 'count',
+        'retmode': 'xml',
+        'email': config.NCBI_EMAIL
+    }
+    
+    try:
+        return parse_esearch_count(await async_ncbi_get(client, 'esearch.fcgi', params, timeout=30))
+    except Exception as e:
+        print(f"Error getting {database} count: {e}")
+        return None
 
-                all_proteins.extend(relevant_proteins)
-                
-                time.sleep(0.3)  # Rate limiting between EFetch calls
+async def async_ncbi_efetch_history(client, database, webenv, query_key, start, max_results, extract_function):
+    """
+    Stream a window of GenBank records from a History server result set,
+    extracting each record as soon as its GBSeq element is complete
+    """
+    params = {
+        'db': database,
+        'WebEnv': webenv,
+        'query_key': query_key,
+        'retstart': start,
+        'retmax': max_results,
+        'rettype': 'gb',
+        'retmode': 'xml',
+        'tool': 'evotree',
+        'email': config.NCBI_EMAIL
+    }
+    
+    try:
+        return await async_ncbi_stream_records(client, 'efetch.fcgi', params, extract_function)
+    except Exception as e:
+        print(f"Error in EFetch {database} GenBank: {e}")
+        return None
+
+async def async_ncbi_efetch_accessions(client, database, webenv, query_key, start, max_results):
+    """
+    List the accession.version identifiers of a window of a History server result set
+    """
+    params = {
+        'db': database,
+        'WebEnv': webenv,
+        'query_key': query_key,
+        'retstart': start,
+        'retmax': max_results,
+        'rettype': 'acc',
+        'retmode': 'text',
+        'tool': 'evotree',
+        'email': config.NCBI_EMAIL
+    }
+    
+    try:
+        content = await async_ncbi_get(client, 'efetch.fcgi', params, timeout=60)
+        return content.decode().split()
+    except Exception as e:
+        print(f"Error listing {database} accessions: {e}")
+        return None
+
+async def async_ncbi_efetch_ids(client, database, ids, extract_function):
+    """
+    Stream GenBank records for a list of UIDs or accession.version identifiers
+    """
+    params = {
+        'db': database,
+        'id': ','.join(ids),
+        'rettype': 'gb',
+        'retmode': 'xml',
+        'tool': 'evotree',
+        'email': config.NCBI_EMAIL
+    }
+    
+    try:
+        return await async_ncbi_stream_records(client, 'efetch.fcgi', params, extract_function, method='POST')
+    except Exception as e:
+        print(f"Error in EFetch {database} GenBank: {e}")
+        return None
+
+async def async_ncbi_esummary_history(client, database, webenv, query_key, start, max_results):
+    """
+    Retrieve compact JSON document summaries (title, organism, length) for a
+    window of a History server result set
+    """
+    params = {
+        'db': database,
+        'WebEnv': webenv,
+        'query_key': query_key,
+        'retstart': start,
+        'retmax': max_results,
+        'retmode': 'json',
+        'tool': 'evotree',
+        'email': config.NCBI_EMAIL
+    }
+    
+    try:
+        return await async_ncbi_get(client, 'esummary.fcgi', params, timeout=120)
+    except Exception as e:
+        print(f"Error in ESummary {database}: {e}")
+        return None
+
+async def async_ncbi_prefilter_by_summary(client, database, webenv, query_key, total, search_term, summary_function, name_key, semaphore, exclude_accessions=None):
+    """
+    Apply the name check to the ESummary titles of the first `total` entries
+    of a History server result set, so that only matching records are fetched
+    Entries whose unversioned accession is in exclude_accessions are dropped
+    Returns the metadata-only records that pass, or None if any window could
+    not be summarized
+    """
+    window_size = config.NCBI_ESUMMARY_WINDOW_SIZE
+    
+    async def summarize_window(start):
+        async with semaphore:
+            summary_json = await async_ncbi_esummary_history(
+                client, database, webenv, query_key, start, min(window_size, total - start)
+            )
+        return parse_esummary_docsums(summary_json) if summary_json else None
+    
+    windows = await asyncio.gather(*(summarize_window(start) for start in range(0, total, window_size)))
+    if any(window is None for window in windows):
+        return None
+    
+    summaries = [
+        summary_function(docsum) for window in windows for docsum in window
+        if docsum.get('accessionversion')
+    ]
+    summaries = [r for r in summaries if is_query_in_name(search_term, r[name_key])]
+    print(f"{len(summaries)} of {total} {database} entries match the name in their summary")
+    if exclude_accessions:
+        matching_count = len(summaries)
+        summaries = [r for r in summaries if r['accession'].split('.')[0] not in exclude_accessions]
+        print(f"{matching_count - len(summaries)} {database} entries skipped, already described by UniProtKB")
+    return summaries
+
+async def async_ncbi_list_accessions(client, database, webenv, query_key, total, semaphore):
+    """
+    List the accessions of the first `total` entries of a History server result set
+    Returns None if any window could not be listed
+    """
+    window_size = config.NCBI_ACCESSION_WINDOW_SIZE
+    
+    async def list_window(start):
+        async with semaphore:
+            return await async_ncbi_efetch_accessions(
+                client, database, webenv, query_key, start, min(window_size, total - start)
+            )
+    
+    windows = await asyncio.gather(*(list_window(start) for start in range(0, total, window_size)))
+    if any(window is None for window in windows):
+        return None
+    return [accession for window in windows for accession in window]
+
+async def iter_completed(coroutines):
+    """
+    Yield the result of each coroutine as soon as it completes, cancelling the
+    ones still running if the consumer stops early
+    """
+    tasks = [asyncio.ensure_future(coroutine) for coroutine in coroutines]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        for task in tasks:
+            task.cancel()
+
+async def async_ncbi_iter_records(client, database, accessions, extract_function, semaphore, checkpoint=None):
+    """
+    Fetch full GenBank records for a list of accession.version identifiers,
+    taking cached records from the local record cache and POSTing EFetch
+    requests for the misses only
+    Yields the records window by window, in completion order
+    """
+    window_size = config.NCBI_EFETCH_WINDOW_SIZE
+    cache = get_record_cache()
+    
+    async def fetch_window(start):
+        kind = f"accession_window:{start}"
+        if checkpoint and checkpoint.get(kind) is not None:
+            return checkpoint.get(kind)
         
-        time.sleep(0.5)  # Rate limiting between ESearch calls
+        window_accessions = accessions[start:start + window_size]
+        cached = cache.get_many(database, window_accessions) if cache else {}
+        missing = [acc for acc in window_accessions if acc not in cached]
+        fetched = []
+        if missing:
+            async with semaphore:
+                fetched = await async_ncbi_efetch_ids(client, database, missing, extract_function)
+            if fetched is None:
+                # Left out of the checkpoint so that a resumed search fetches it again
+                return list(cached.values())
+            if cache:
+                cache.put_many(database, fetched)
+        records = list(cached.values()) + fetched
+        if checkpoint:
+            checkpoint.save(kind, records)
+        return records
     
-    return all_proteins
+    async for records in iter_completed(fetch_window(start) for start in range(0, len(accessions), window_size)):
+        yield records
 
-def search_genes_by_name(gene_name, taxid=None, max_results=None):
-    query = build_mrna_query(gene_name, taxid)
-    # Count first
-    count_xml = ncbi_esearch_count(query, database='nucleotide')
-    total_count = parse_esearch_count(count_xml)
+async def async_ncbi_fetch_records(client, database, accessions, extract_function, semaphore, checkpoint=None):
+    """
+    Same as async_ncbi_iter_records, collected into one list
+    """
+    records = []
+    async for window in async_ncbi_iter_records(client, database, accessions, extract_function, semaphore, checkpoint):
+        records.extend(window)
+    return records
+
+async def search_ncbi_by_name(client, query, database, search_term, extract_function, summary_function, name_key, max_results=None, metadata_only=False, exclude_accessions=None, failures=None):
+    """
+    Run an ESearch query once on the History server, then page EFetch through
+    the stored result set, keeping several windows in flight under the shared
+    NCBI rate limit. ESummary titles are checked first so that only records
+    matching the name are fetched, and records already in the local record
+    cache are not fetched
+    Records are yielded in batches, one per window as soon as it completes, so
+    that results can be shown before the whole search is over
+    With metadata_only, the ESummary records are yielded as they are and
+    sequences are left to fetch_missing_sequences
+    Entries whose accession is in exclude_accessions are dropped at the
+    ESummary stage, which then runs even without the prefilter. Nothing is
+    yielded when that stage fails
+    Progress is checkpointed so that an interrupted search resumes from its
+    last completed batch. Windows that could not be fetched are reported by
+    appending the database to `failures`
+    """
+    checkpoint = SearchCheckpoint(
+        database, query, max_results, metadata_only, config.NCBI_ESUMMARY_PREFILTER, sorted(exclude_accessions or ())
+    )
+    saved_state = checkpoint.load()
     
-    if total_count == 0:
-        return []
+    if saved_state and time.time() - saved_state['time'] < config.NCBI_HISTORY_TTL:
+        total_count, webenv, query_key = saved_state['count'], saved_state['webenv'], saved_state['query_key']
+    else:
+        search_xml = await async_ncbi_esearch_history(client, query, database)
+        total_count, webenv, query_key = parse_esearch_history(search_xml)
+        if total_count == 0 or not webenv:
+            return
+        if saved_state and saved_state['count'] != total_count:
+            # The result set changed, completed batches no longer line up
+            checkpoint.reset()
+        checkpoint.save_state(total_count, webenv, query_key)
     
     # Use all results if max_results is None, otherwise limit
     actual_max = total_count if max_results is None else min(total_count, max_results)
+    print(f"Found {total_count} {database} entries, retrieving {actual_max}...")
     
-    # Retrieve IDs in batches
-    all_mrna = []
-    search_batch_size = 500  # For ESearch
-    efetch_batch_size = 50   # Smaller batches for EFetch to avoid URI too long error
-    print(f"Found {total_count} mRNA sequences, retrieving up to {actual_max}...")
-    for start in range(0, actual_max, search_batch_size):
-        current_batch = min(search_batch_size, actual_max - start)
+    window_size = config.NCBI_EFETCH_WINDOW_SIZE
+    semaphore = asyncio.Semaphore(config.NCBI_MAX_CONCURRENT_REQUESTS)
+    cache = get_record_cache()
+    
+    if config.NCBI_ESUMMARY_PREFILTER or metadata_only or exclude_accessions:
+        summaries = checkpoint.get('summaries')
+        if summaries is None:
+            summaries = await async_ncbi_prefilter_by_summary(
+                client, database, webenv, query_key, actual_max, search_term, summary_function, name_key, semaphore,
+                exclude_accessions
+            )
+            if summaries is not None:
+                checkpoint.save('summaries', summaries)
+        if summaries is not None:
+            if metadata_only:
+                checkpoint.discard()
+                yield summaries
+                return
+            accessions = [summary['accession'] for summary in summaries]
+            async for records in async_ncbi_iter_records(client, database, accessions, extract_function, semaphore, checkpoint):
+                yield [r for r in records if is_query_in_name(search_term, r[name_key])]
+            if all(checkpoint.get(f"accession_window:{start}") is not None for start in range(0, len(accessions), window_size)):
+                checkpoint.discard()
+            elif failures is not None:
+                failures.append(database)
+            return
+        # Fetching the full records instead would change the results (sequences,
+        # excluded entries) and the traffic, the search resumes from here later
+        print(f"ESummary of {database} failed, search incomplete")
+        if failures is not None:
+            failures.append(database)
+        return
+    
+    # Accessions of the stored result set, in History server order
+    accessions = None
+    if cache:
+        accessions = await async_ncbi_list_accessions(client, database, webenv, query_key, actual_max, semaphore)
+    
+    async def fetch_window(start):
+        kind = f"window:{start}"
+        if checkpoint.get(kind) is not None:
+            return checkpoint.get(kind)
         
-        # Search for mRNA IDs in Nucleotide database
-        search_xml = ncbi_esearch(query, 'nucleotide', start, current_batch)
-        mrna_ids = parse_esearch_ids(search_xml)
+        window_max = min(window_size, actual_max - start)
+        cached = {}
+        missing = None
+        if accessions is not None:
+            window_accessions = accessions[start:start + window_max]
+            cached = cache.get_many(database, window_accessions)
+            missing = [acc for acc in window_accessions if acc not in cached]
         
-        if mrna_ids:
-            # Process IDs in smaller chunks for EFetch
-            for i in range(0, len(mrna_ids), efetch_batch_size):
-                chunk_ids = mrna_ids[i:i + efetch_batch_size]
-                
-                # Retrieve GenBank details for this chunk
-                details_xml = ncbi_efetch_mrna_genbank(chunk_ids)
-                mrna_sequences = parse_genbank_mrna(details_xml)
-
-                relevant_mrna = [m for m in mrna_sequences if is_query_in_name(gene_name, m['gene_name'])]
-
-                all_mrna.extend(relevant_mrna)
-                
-                time.sleep(0.3)  # Rate limiting between EFetch calls
+        if missing is None or len(cached) == 0:
+            async with semaphore:
+                fetched = await async_ncbi_efetch_history(
+                    client, database, webenv, query_key, start, window_max, extract_function
+                )
+        elif missing:
+            async with semaphore:
+                fetched = await async_ncbi_efetch_ids(client, database, missing, extract_function)
+        else:
+            fetched = []
         
-        time.sleep(0.5)  # Rate limiting between ESearch calls
+        completed = fetched is not None
+        fetched = fetched or []
+        if cache:
+            cache.put_many(database, fetched)
+        records = list(cached.values()) + fetched
+        records = [r for r in records if is_query_in_name(search_term, r[name_key])]
+        if completed:
+            checkpoint.save(kind, records)
+        return records
     
-    return all_mrna
+    async for records in iter_completed(fetch_window(start) for start in range(0, actual_max, window_size)):
+        yield records
+    if all(checkpoint.get(f"window:{start}") is not None for start in range(0, actual_max, window_size)):
+        checkpoint.discard()
+    elif failures is not None:
+        failures.append(database)
+
+# =============================================================================
+# HIGH-LEVEL ORCHESTRATION FUNCTIONS
+# =============================================================================
+
+async def search_proteins_by_name(client, protein_name, taxid=None, max_results=None, metadata_only=False, exclude_accessions=None, failures=None):
+    query = build_protein_query(protein_name, taxid)
+    async for proteins in search_ncbi_by_name(
+        client, query, 'protein', protein_name, extract_genbank_protein_info, protein_record_from_docsum,
+        'protein_name', max_results, metadata_only, exclude_accessions, failures
+    ):
+        yield proteins
+
+async def search_genes_by_name(client, gene_name, taxid=None, max_results=None, metadata_only=False, failures=None):
+    query = build_mrna_query(gene_name, taxid)
+    async for mrna_sequences in search_ncbi_by_name(
+        client, query, 'nucleotide', gene_name, extract_genbank_mrna_info, mrna_record_from_docsum,
+        'gene_name', max_results, metadata_only, failures=failures
+    ):
+        yield mrna_sequences
 
 # =============================================================================
 # MAIN API FUNCTION
 # =============================================================================
 
-def fetch_ncbi_proteins(protein_name, taxid=None, max_results=None):
+async def fetch_ncbi_proteins(protein_name, taxid=None, max_results=None, metadata_only=False, exclude_accessions=None, failures=None):
     """
-    Fetch proteins by name from NCBI Protein database
+    Fetch proteins by name from NCBI Protein database, yielding them in batches
     If max_results is None, retrieves ALL available results
+    With metadata_only, records have no sequence and no mRNA until fetch_missing_sequences
+    Proteins whose unversioned accession is in exclude_accessions are not retrieved
+    The database is appended to the failures list given if some could not be retrieved
     """
-    proteins = search_proteins_by_name(protein_name, taxid, max_results)
-    return proteins
+    client = get_async_client('ncbi')
+    async for proteins in search_proteins_by_name(client, protein_name, taxid, max_results, metadata_only, exclude_accessions, failures):
+        yield [record_from_ncbi(protein) for protein in proteins]
 
-def fetch_ncbi_genes(gene_name, taxid=None, max_results=None):
+async def fetch_ncbi_genes(gene_name, taxid=None, max_results=None, metadata_only=False, failures=None):
     """
-    Fetch mRNA sequences by gene name from NCBI Nucleotide database
+    Fetch mRNA sequences by gene name from NCBI Nucleotide database, yielding them in batches
     If max_results is None, retrieves ALL available results
+    With metadata_only, records have no sequence until fetch_missing_sequences
+    The database is appended to the failures list given if some could not be retrieved
     """
-    mrna_sequences = search_genes_by_name(gene_name, taxid, max_results)
-    return mrna_sequences
+    client = get_async_client('ncbi')
+    async for mrna_sequences in search_genes_by_name(client, gene_name, taxid, max_results, metadata_only, failures):
+        yield [record_from_ncbi(mrna) for mrna in mrna_sequences]
+
+async def count_ncbi_proteins(protein_name, taxid=None):
+    return await async_ncbi_esearch_count(get_async_client('ncbi'), build_protein_query(protein_name, taxid), 'protein')
+
+async def count_ncbi_genes(gene_name, taxid=None):
+    return await async_ncbi_esearch_count(get_async_client('ncbi'), build_mrna_query(gene_name, taxid), 'nucleotide')
+
+async def fetch_missing_sequences(records, database):
+    """
+    Fill in, in place and in bulk, the sequence (and mRNA for proteins) of the
+    NCBI records that were retrieved in metadata-only mode
+    """
+    pending = [r for r in records if r.database == 'NCBI' and r.sequence is None]
+    if not pending:
+        return records
+    
+    extract_function = extract_genbank_mrna_info if database == 'nucleotide' else extract_genbank_protein_info
+    accessions = list(dict.fromkeys(r.accession for r in pending))
+    print(f"Retrieving {len(accessions)} {database} sequences...")
+    
+    semaphore = asyncio.Semaphore(config.NCBI_MAX_CONCURRENT_REQUESTS)
+    full_records = await async_ncbi_fetch_records(get_async_client('ncbi'), database, accessions, extract_function, semaphore)
+    by_accession = {r['accession']: r for r in full_records}
+    
+    for record in pending:
+        full_record = by_accession.get(record.accession)
+        if full_record:
+            record.sequence = full_record['sequence']
+            if 'mRNA' in full_record:
+                record.mRNA = full_record['mRNA']
+    return records
 
 # =============================================================================
 # FASTA CREATION (for compatibility)
 # =============================================================================
 
+async def iter_ncbi_fasta_payload(selected_data, fasta_file):
+    """
+    JSON body of /create_ncbi_fasta, streamed record by record with the
+    sequences sent straight from the sequence store
+    GenBank sequences are plain letters and need no JSON escaping
+    """
+    yield b'{"selected_data": ['
+    separator = b''
+    for record in selected_data:
+        if record.database != 'NCBI':
+            continue
+        fields = json.dumps(record.to_dict(with_sequence=False))
+        sequence = record.sequence_view()
+        if sequence is None:
+            yield separator + fields[:-1].encode() + b', "sequence": null}'
+        else:
+            yield separator + fields[:-1].encode() + b', "sequence": "'
+            yield sequence
+            yield b'"}'
+        separator = b', '
+    yield f'], "fasta_file": {json.dumps(fasta_file)}}}'.encode()
+
 async def create_ncbi_fasta(selected_data, loading_spinner):
     identifier = datetime.now().strftime("%d%m%Y%H%M%S")
     fasta_file = f"{identifier}_NCBI.fasta"
     loading_spinner.set_visibility(True)
     
     try:
-        async with httpx.AsyncClient(timeout=360000) as client:
-            response = await client.post(
-                "http://134.158.151.55/create_ncbi_fasta", 
-                json={"selected_data": selected_data, "fasta_file": fasta_file}
-            )
-            if response.status_code == 200:
-                data = response.json()
-                return data['file']
-            else:
-                print(f"Flask request failed with status code: {response.status_code}")
-                return 'Failed'
+        response = await get_async_client('pipeline').post(
+            f"{config.API_BASE_URL}/create_ncbi_fasta", 
+            content=iter_ncbi_fasta_payload(selected_data, fasta_file),
+            headers={'Content-Type': 'application/json'},
+            timeout=360000
+        )
+        if response.status_code == 200:
+            data = response.json()
+            return data['file']
+        else:
+            print(f"Flask request failed with status code: {response.status_code}")
+            return 'Failed'
     except Exception as e:
         print(f"Error creating FASTA: {e}")
         return 'Failed'
@@ -533,47 +988,63 @@ async def create_ncbi_fasta(selected_data, loading_spinner):
 # mRNA EXTRACTION FUNCTIONS
 # =============================================================================
 
-def mrna_from_mrna_accession(mrna_accessions):
+async def mrna_from_mrna_accession(mrna_accessions, failures=None):
+    """
+    Retrieve mRNA records for a list of accessions: records in the local
+    record cache are taken from it (accession.version keys), the others are
+    posted once to the History server with EPost, then streamed back in
+    concurrent EFetch windows
+    'nucleotide' is appended to the failures list given if the EPost or an
+    EFetch window failed
+    """
     if not mrna_accessions:
         return []
     
     unique_accessions = list(dict.fromkeys(mrna_accessions))
     print(f"{len(unique_accessions)} unique mRNA accessions to process")
     
-    all_mrna = []
-    found_accessions = set()
-    search_batch_size = 50
-    efetch_batch_size = 50
-    
-    for i in range(0, len(unique_accessions), efetch_batch_size):
-        batch_accessions = unique_accessions[i:i + efetch_batch_size]
-        try:
-            accession_query = ' OR '.join([f'{acc}[ACCN]' for acc in batch_accessions])
-            search_xml = ncbi_esearch(accession_query, 'nucleotide', 0, search_batch_size)
-            mrna_ids = parse_esearch_ids(search_xml)
-            if mrna_ids:               
-                for j in range(0, len(mrna_ids), efetch_batch_size):
-                    chunk_ids = mrna_ids[j:j + efetch_batch_size]
-                    
-                    details_xml = ncbi_efetch_mrna_genbank(chunk_ids)
-                    mrna_sequences = parse_genbank_mrna(details_xml)
-                    
-                    for mrna in mrna_sequences:
-                        found_accessions.add(mrna.get('accession', ''))
-                    all_mrna.extend(mrna_sequences)
-                    time.sleep(0.3)
-            else:
-                print(f"No IDs found for batch {i//efetch_batch_size + 1}")
+    cache = get_record_cache()
+    cached = cache.get_many('nucleotide', unique_accessions) if cache else {}
+    missing = [acc for acc in unique_accessions if acc not in cached]
+    if cached:
+        print(f"{len(cached)} mRNA records found in the record cache")
+    
+    fetched = []
+    if missing:
+        client = get_async_client('ncbi')
+        post_xml = await async_ncbi_epost(client, 'nucleotide', missing)
+        webenv, query_key = parse_epost_history(post_xml)
+        if not webenv and failures is not None:
+            failures.append('nucleotide')
+        
+        if webenv:
+            window_size = config.NCBI_EFETCH_WINDOW_SIZE
+            semaphore = asyncio.Semaphore(config.NCBI_MAX_CONCURRENT_REQUESTS)
             
-            time.sleep(0.5)
+            async def fetch_window(start):
+                async with semaphore:
+                    records = await async_ncbi_efetch_history(
+                        client, 'nucleotide', webenv, query_key, start, window_size, extract_genbank_mrna_info
+                    )
+                return records
             
-        except Exception as e:
-            print(f"Error processing accession batch {i//efetch_batch_size + 1}: {e}")
-            continue
+            # Unknown accessions are dropped by EPost, so the last windows may come back empty
+            windows = await asyncio.gather(*(fetch_window(start) for start in range(0, len(missing), window_size)))
+            if any(window is None for window in windows) and failures is not None:
+                failures.append('nucleotide')
+            fetched = [mrna for window in windows if window for mrna in window]
+            if cache:
+                cache.put_many('nucleotide', fetched)
+    
+    all_mrna = list(cached.values()) + fetched
+    found_accessions = set(mrna.get('accession', '') for mrna in all_mrna)
     
-    requested_accessions = set(unique_accessions)
+    # Accessions are requested with their version when UniProt gives it
     parsed_found_accessions = set(acc.split('.')[0] for acc in found_accessions if acc)
-    missing_accessions = requested_accessions - parsed_found_accessions
+    missing_accessions = [
+        acc for acc in unique_accessions
+        if acc not in found_accessions and acc not in parsed_found_accessions
+    ]
     
     print(f"Successfully retrieved {len(all_mrna)} mRNA sequences from {len(unique_accessions)} accessions")
     
@@ -584,4 +1055,4 @@ def mrna_from_mrna_accession(mrna_accessions):
     else:
         print("✅ All accessions were successfully retrieved!")
     
-    return all_mrna
+    return [record_from_ncbi(mrna) for mrna in all_mrna]
@@ -1,40 +1,70 @@
 import asyncio
-import httpx
+import codecs
+import json
 from nicegui import ui
 from datetime import datetime
 import config
-from uniprot import create_uniprot_fasta
-from ncbi import create_ncbi_fasta
+from http_clients import get_async_client
+from uniprot import create_uniprot_fasta, iter_uniprot_fasta, fetch_uniprot_sequences
+from ncbi import create_ncbi_fasta, fetch_missing_sequences
 from utils import download_file_from_server
+from sequence_store import get_sequence_store
+from result_store import deduplicate_sequences
 
 
 # =============================================================================
 # FASTA CREATION FUNCTIONS
 # =============================================================================
 
+async def iter_stored_content(fasta_content, chunk_size=1024 * 1024):
+    """
+    Content kept in the sequence store, chunk by chunk
+    """
+    content = get_sequence_store().view(fasta_content)
+    for start in range(0, len(content), chunk_size):
+        yield content[start:start + chunk_size]
+
+async def iter_upload_payload(chunks, file_path):
+    """
+    JSON body of /upload, escaping the FASTA content chunk by chunk as it is
+    produced instead of building the whole payload in memory
+    """
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    yield b'{"content": "'
+    async for chunk in chunks:
+        text = decoder.decode(chunk)
+        yield json.dumps(text)[1:-1].encode()
+    # Bytes of a character split at the very end are only decoded by the final flush
+    yield json.dumps(decoder.decode(b'', final=True))[1:-1].encode()
+    yield f'", "file_path": {json.dumps(file_path)}}}'.encode()
+
 async def upload_custom_fasta_to_server(fasta_content, filename):
-    from datetime import datetime
+    return await upload_fasta_to_server(iter_stored_content(fasta_content), filename)
+
+async def upload_fasta_to_server(chunks, filename):
+    """
+    Stream FASTA content (bytes chunks) to the server in one /upload request
+    """
     identifier = datetime.now().strftime("%d%m%Y%H%M%S")
     server_filename = f"{identifier}_{filename}"
     
     config.loading_spinner.set_visibility(True)
     try:
-        async with httpx.AsyncClient(timeout=60) as client:
-            response = await client.post(
-                f"{config.API_BASE_URL}/upload",
-                json={
-                    "content": fasta_content,
-                    "file_path": f"evotree/tmp/{server_filename}"
-                }
-            )
-            if response.status_code == 200:
-                data = response.json()
-                return data['file']
-            else:
-                print(f"Upload failed with status code: {response.status_code}")
-                return 'Failed'
+        client = get_async_client('pipeline')
+        response = await client.post(
+            f"{config.API_BASE_URL}/upload",
+            content=iter_upload_payload(chunks, f"evotree/tmp/{server_filename}"),
+            headers={'Content-Type': 'application/json'},
+            timeout=60
+        )
+        if response.status_code == 200:
+            data = response.json()
+            return data['file']
+        else:
+            print(f"Upload failed with status code: {response.status_code}")
+            return 'Failed'
     except Exception as e:
-        print(f"Error uploading custom FASTA: {e}")
+        print(f"Error uploading FASTA: {e}")
         return 'Failed'
     finally:
         config.loading_spinner.set_visibility(False)
@@ -45,43 +75,98 @@ async def create_fasta_from_branch_length(download, original_fasta_file, nw_dist
     config.loading_spinner.set_visibility(True)
     
     try:
-        async with httpx.AsyncClient(timeout=360000) as client:
-            response = await client.post(
-                f"{config.API_BASE_URL}/create_bl_fasta",
-                json={
-                    "original_fasta_file": original_fasta_file,
-                    "nw_distance_file": nw_distance_file,
-                    "bl_fasta_file": bl_fasta_file
-                }
-            )
-            if response.status_code == 200:
-                data = response.json()
-                if download:
-                    download_file_from_server(data['file'])
-                return data['file']
-            else:
-                print(f"Flask request failed with status code: {response.status_code}")
-                return 'Failed'
+        client = get_async_client('pipeline')
+        response = await client.post(
+            f"{config.API_BASE_URL}/create_bl_fasta",
+            json={
+                "original_fasta_file": original_fasta_file,
+                "nw_distance_file": nw_distance_file,
+                "bl_fasta_file": bl_fasta_file
+            },
+            timeout=360000
+        )
+        if response.status_code == 200:
+            data = response.json()
+            if download:
+                download_file_from_server(data['file'])
+            return data['file']
+        else:
+            print(f"Flask request failed with status code: {response.status_code}")
+            return 'Failed'
     except Exception as e:
         print(f"Error creating FASTA: {e}")
         return 'Failed'
     finally:
         config.loading_spinner.set_visibility(False)
 
+async def prepare_selected_sequences():
+    """
+    Selected records with their sequences: NCBI and UniProtKB ones fetched
+    if missing, identical ones merged into their representatives
+    Returns (records, whether the UniProt FASTA can be built locally)
+    """
+    if config.selection_params['ncbi']:
+        database = 'nucleotide' if config.current_search_type == 'gene' else 'protein'
+        await fetch_missing_sequences(config.selected_data, database)
+    local_uniprot = False
+    if config.selection_params['uniprot'] and config.UNIPROT_LOCAL_FASTA:
+        failures = []
+        await fetch_uniprot_sequences(config.selected_data, failures)
+        if failures:
+            # The server-side query would ignore the selection and the deduplication
+            raise RuntimeError('Some UniProtKB sequences could not be retrieved, try again later')
+        local_uniprot = has_uniprot_sequences(config.selected_data)
+        if not local_uniprot and any(record.database == 'UniProtKB' for record in config.selected_data):
+            ui.notify(
+                'Some selected UniProtKB entries have no sequence, the UniProt FASTA is queried from UniProt instead',
+                color='warning'
+            )
+    selected_data = config.selected_data
+    if config.DEDUPLICATE_SEQUENCES:
+        if not local_uniprot:
+            # The UniProt FASTA queried by the server could not list the accessions merged into its entries
+            selected_data = [record for record in selected_data if record.database != 'UniProtKB']
+        deduplicated = deduplicate_sequences(selected_data)
+        merged = len(selected_data) - len(deduplicated)
+        selected_data = deduplicated
+        if merged:
+            print(f"{merged} identical sequences merged into their representatives")
+            ui.notify(f'{merged} duplicate sequences merged', color='info')
+    return selected_data, local_uniprot
+
+def has_uniprot_sequences(selected_data):
+    """
+    Whether there are selected UniProtKB records and all have their sequence,
+    so that the UniProt FASTA can be built locally
+    """
+    uniprot_records = [record for record in selected_data if record.database == 'UniProtKB']
+    return bool(uniprot_records) and all(record.sequence_ref is not None for record in uniprot_records)
+
 async def create_fasta(download=False):
     min_length = config.selection_params['min_length']
     max_length = config.selection_params['max_length']
     uniprot_file_path = None
     ncbi_file_path = None
     
+    try:
+        selected_data, local_uniprot = await prepare_selected_sequences()
+    except Exception as e:
+        print(f"Error occurred (prepare_selected_sequences): {e}")
+        ui.notify(f'Error: {str(e)}', color='red')
+        return 'Failed'
+    
     if config.selection_params['uniprot']:
         try:
-            base_url = "https://rest.uniprot.org/uniprotkb/stream"
-            params = {
-                'query': f"taxonomy_id:{config.search_params['taxid']} AND protein_name:{config.search_params['term'].replace(' ', '+')} AND length:[{min_length} TO {max_length}]",
-                'format': 'fasta'
-            }
-            uniprot_file_path = await create_uniprot_fasta(base_url, params, config.loading_spinner)
+            if local_uniprot:
+                # Only the selected entries are sent, with the sequences fetched for them
+                uniprot_file_path = await upload_fasta_to_server(iter_uniprot_fasta(selected_data), "Uniprot.fasta")
+            else:
+                base_url = "https://rest.uniprot.org/uniprotkb/stream"
+                params = {
+                    'query': f"taxonomy_id:{config.search_params['taxid']} AND protein_name:{config.search_params['term'].replace(' ', '+')} AND length:[{min_length} TO {max_length}]",
+                    'format': 'fasta'
+                }
+                uniprot_file_path = await create_uniprot_fasta(base_url, params, config.loading_spinner)
             if uniprot_file_path == "Failed":
                 print(f"Failed to create UniProt FASTA file.")
                 return 'Failed'
@@ -92,7 +177,7 @@ async def create_fasta(download=False):
 
     if config.selection_params['ncbi']:
         try:
-            ncbi_file_path = await create_ncbi_fasta(config.selected_data, config.loading_spinner)
+            ncbi_file_path = await create_ncbi_fasta(selected_data, config.loading_spinner)
             if ncbi_file_path == "Failed":
                 print(f"Failed to create NCBI FASTA file.")
                 return 'Failed'
@@ -135,18 +220,18 @@ async def merge_uniprot_ncbi_fasta(uniprot_file_path, ncbi_file_path, loading_sp
     loading_spinner.set_visibility(True)
     
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                f"{config.API_BASE_URL}/merge_uniprot_ncbi_fasta",
-                json={"uniprot_file": uniprot_file_path, "ncbi_file": ncbi_file_path, "merged_file": fasta_file}
-            )
-            if response.status_code == 200:
-                data = response.json()
-                print(f"Response from Flask: {data}")
-                return data['file']
-            else:
-                print(f"Flask request failed with status code: {response.status_code}")
-                return 'Failed'
+        client = get_async_client('pipeline')
+        response = await client.post(
+            f"{config.API_BASE_URL}/merge_uniprot_ncbi_fasta",
+            json={"uniprot_file": uniprot_file_path, "ncbi_file": ncbi_file_path, "merged_file": fasta_file}
+        )
+        if response.status_code == 200:
+            data = response.json()
+            print(f"Response from Flask: {data}")
+            return data['file']
+        else:
+            print(f"Flask request failed with status code: {response.status_code}")
+            return 'Failed'
     except Exception as e:
         print(f"Error occurred: {e}")
         return 'Failed'
@@ -270,66 +355,66 @@ async def update_progress(progress_label, step_indicators, current_step, message
             circle.text = str(i + 1)
 
 async def run_mafft_pipeline(fasta_file_path):
-    async with httpx.AsyncClient() as client:
-        response = await client.post(f"{config.API_BASE_URL}/mafft_start", json={"fasta_file": fasta_file_path}, timeout=10)
-        if response.status_code == 200:
-            job_id = response.json()['job_id']
-            while True:
-                await asyncio.sleep(2)
-                status_resp = await client.get(f"{config.API_BASE_URL}/mafft_status?id={job_id}")
-                status_data = status_resp.json()
-                if status_data['status'] == 'finished':
-                    return status_data['file']
-                elif status_data['status'] == 'error':
-                    raise Exception(f"MAFFT error: {status_data.get('message', '')}")
-        else:
-            raise Exception(f"MAFFT request failed with status code: {response.status_code}")
+    client = get_async_client('pipeline')
+    response = await client.post(f"{config.API_BASE_URL}/mafft_start", json={"fasta_file": fasta_file_path}, timeout=10)
+    if response.status_code == 200:
+        job_id = response.json()['job_id']
+        while True:
+            await asyncio.sleep(2)
+            status_resp = await client.get(f"{config.API_BASE_URL}/mafft_status?id={job_id}")
+            status_data = status_resp.json()
+            if status_data['status'] == 'finished':
+                return status_data['file']
+            elif status_data['status'] == 'error':
+                raise Exception(f"MAFFT error: {status_data.get('message', '')}")
+    else:
+        raise Exception(f"MAFFT request failed with status code: {response.status_code}")
 
 async def run_bmge_pipeline(mafft_file_path):
-    async with httpx.AsyncClient() as client:
-        response = await client.post(f"{config.API_BASE_URL}/bmge_start", json={"fasta_file": mafft_file_path}, timeout=10)
-        if response.status_code == 200:
-            job_id = response.json()['job_id']
-            while True:
-                await asyncio.sleep(2)
-                status_resp = await client.get(f"{config.API_BASE_URL}/bmge_status?id={job_id}")
-                status_data = status_resp.json()
-                if status_data['status'] == 'finished':
-                    return status_data['file']
-                elif status_data['status'] == 'error':
-                    raise Exception(f"BMGE error: {status_data.get('message', '')}")
-        else:
-            raise Exception(f"BMGE request failed with status code: {response.status_code}")
+    client = get_async_client('pipeline')
+    response = await client.post(f"{config.API_BASE_URL}/bmge_start", json={"fasta_file": mafft_file_path}, timeout=10)
+    if response.status_code == 200:
+        job_id = response.json()['job_id']
+        while True:
+            await asyncio.sleep(2)
+            status_resp = await client.get(f"{config.API_BASE_URL}/bmge_status?id={job_id}")
+            status_data = status_resp.json()
+            if status_data['status'] == 'finished':
+                return status_data['file']
+            elif status_data['status'] == 'error':
+                raise Exception(f"BMGE error: {status_data.get('message', '')}")
+    else:
+        raise Exception(f"BMGE request failed with status code: {response.status_code}")
 
 async def run_iqtree_pipeline(file_path):
-    async with httpx.AsyncClient() as client:
-        response = await client.post(f"{config.API_BASE_URL}/iqtree_start", json={"fasta_file": file_path}, timeout=10)
-        if response.status_code == 200:
-            job_id = response.json()['job_id']
-            while True:
-                await asyncio.sleep(2)
-                status_resp = await client.get(f"{config.API_BASE_URL}/iqtree_status?id={job_id}")
-                status_data = status_resp.json()
-                if status_data['status'] == 'finished':
-                    return status_data['file']
-                elif status_data['status'] == 'error':
-                    raise Exception(f"IQTREE error: {status_data.get('message', '')}")
-        else:
-            raise Exception(f"IQTREE request failed with status code: {response.status_code}")
+    client = get_async_client('pipeline')
+    response = await client.post(f"{config.API_BASE_URL}/iqtree_start", json={"fasta_file": file_path}, timeout=10)
+    if response.status_code == 200:
+        job_id = response.json()['job_id']
+        while True:
+            await asyncio.sleep(2)
+            status_resp = await client.get(f"{config.API_BASE_URL}/iqtree_status?id={job_id}")
+            status_data = status_resp.json()
+            if status_data['status'] == 'finished':
+                return status_data['file']
+            elif status_data['status'] == 'error':
+                raise Exception(f"IQTREE error: {status_data.get('message', '')}")
+    else:
+        raise Exception(f"IQTREE request failed with status code: {response.status_code}")
 
 async def run_nw_distance_pipeline(treefile):
-    async with httpx.AsyncClient() as client:
-        response = await client.post(f"{config.API_BASE_URL}/nw_distance_start", json={"treefile": treefile}, timeout=10)
-        if response.status_code == 200:
-            job_id = response.json()['job_id']
-            while True:
-                await asyncio.sleep(2)
-                status_resp = await client.get(f"{config.API_BASE_URL}/nw_distance_status?id={job_id}")
-                status_data = status_resp.json()
-                if status_data['status'] == 'finished':
-                    return status_data['file']
-                elif status_data['status'] == 'error':
-                    raise Exception(f"NW Distance error: {status_data.get('message', '')}")
-        else:
-            raise Exception(f"NW Distance request failed with status code: {response.status_code}")
+    client = get_async_client('pipeline')
+    response = await client.post(f"{config.API_BASE_URL}/nw_distance_start", json={"treefile": treefile}, timeout=10)
+    if response.status_code == 200:
+        job_id = response.json()['job_id']
+        while True:
+            await asyncio.sleep(2)
+            status_resp = await client.get(f"{config.API_BASE_URL}/nw_distance_status?id={job_id}")
+            status_data = status_resp.json()
+            if status_data['status'] == 'finished':
+                return status_data['file']
+            elif status_data['status'] == 'error':
+                raise Exception(f"NW Distance error: {status_data.get('message', '')}")
+    else:
+        raise Exception(f"NW Distance request failed with status code: {response.status_code}")
         
\ No newline at end of file
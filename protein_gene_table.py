@@ -2,30 +2,68 @@ from nicegui import ui
 import config
 
 def create_gene_table():
+    """
+    Create the (possibly still empty) NCBI gene table, rows are added with
+    add_table_rows as search batches arrive
+    """
     with config.table_container:
-        if config.ncbi_genes:
-            create_ncbi_table(config.ncbi_genes, mode='gene')
-        else:
-            ui.markdown('**No NCBI Gene results found**')
+        config.result_tables = {
+            'ncbi': create_table_view(
+                None, 'NCBI Gene', create_ncbi_table(config.ncbi_genes, mode='gene'), lambda item: ncbi_row(item, 'gene')
+            )
+        }
 
 def create_protein_table():
+    """
+    Create the (possibly still empty) UniProtKB and NCBI tables, rows are added
+    with add_table_rows as search batches arrive
+    """
     with config.table_container:
         with ui.tabs() as tabs:
-            uniprot_tab = ui.tab(f'UniProtKB ({len(config.uniprot_proteins)})')
-            ncbi_tab = ui.tab(f'NCBI ({len(config.ncbi_proteins)})')
+            uniprot_tab = ui.tab('uniprot', label=f'UniProtKB ({config.all_proteins.count("UniProtKB")})')
+            ncbi_tab = ui.tab('ncbi', label=f'NCBI ({config.all_proteins.count("NCBI")})')
         
         with ui.tab_panels(tabs, value=uniprot_tab).classes('w-full'):
             with ui.tab_panel(uniprot_tab):
-                if config.uniprot_proteins:
-                    create_uniprot_table(config.uniprot_proteins)
-                else:
-                    ui.markdown('**No UniProtKB results found**')
+                uniprot_view = create_table_view(
+                    uniprot_tab, 'UniProtKB', create_uniprot_table(config.all_proteins.select('UniProtKB')), uniprot_row
+                )
             
             with ui.tab_panel(ncbi_tab):
-                if config.ncbi_proteins:
-                    create_ncbi_table(config.ncbi_proteins, mode="protein")
-                else:
-                    ui.markdown('**No NCBI results found**')
+                ncbi_view = create_table_view(
+                    ncbi_tab, 'NCBI', create_ncbi_table(config.all_proteins.select('NCBI'), mode="protein"), lambda item: ncbi_row(item, 'protein')
+                )
+    
+    config.result_tables = {'uniprot': uniprot_view, 'ncbi': ncbi_view}
+
+def create_table_view(tab, label, table, row_function):
+    empty_message = ui.markdown(f'**No {label} results found**')
+    empty_message.set_visibility(False)
+    return {'tab': tab, 'label': label, 'table': table, 'row_function': row_function, 'empty_message': empty_message}
+
+def add_table_rows(source, items):
+    view = config.result_tables[source]
+    view['table'].add_rows([view['row_function'](item) for item in items])
+    if view['tab']:
+        view['tab'].props(f'label="{view["label"]} ({len(view["table"].rows)})"')
+
+def refresh_table_rows(source, items):
+    """
+    Rebuild the rows of a table, after its records were completed
+    """
+    view = config.result_tables.get(source)
+    if view:
+        view['table'].rows = [view['row_function'](item) for item in items]
+        view['table'].update()
+
+def finish_tables():
+    """
+    Replace the tables left empty at the end of the search by a message
+    """
+    for view in config.result_tables.values():
+        if not view['table'].rows:
+            view['table'].set_visibility(False)
+            view['empty_message'].set_visibility(True)
 
 def create_uniprot_table(data):
     columns = [
@@ -40,72 +78,27 @@ def create_uniprot_table(data):
     
     ]
     
-    rows = []
-    for item in data:
-        row = {}
-
-        entry_type = item.get('entryType', '')
-        if 'unreviewed' in entry_type.lower():
-            row['entry_type'] = 'TrEMBL'
-        elif 'reviewed' in entry_type.lower():
-            row['entry_type'] = 'SwissProt'
-        else:
-            row['entry_type'] = entry_type or 'N/A'
-
-        accession = item.get('primaryAccession', 'N/A')
-        id = item.get('uniProtkbId', 'N/A')
-        if row['entry_type'] == 'SwissProt':
-            row['accession'] = f"sp|{accession}|{id}"
-        else:
-            row['accession'] = f"tr|{accession}|{id}"
-
-        try:
-            row['taxid'] = item['organism']['taxonId']
-        except (KeyError, TypeError):
-            row['taxid'] = 'N/A'
-        
-        try:
-            row['scientific_name'] = item['organism']['scientificName']
-        except (KeyError, TypeError, IndexError):
-            row['scientific_name'] = 'N/A'
-        
-        try:
-            if 'recommendedName' in item['proteinDescription']:
-                row['protein_name'] = item['proteinDescription']['recommendedName']['fullName']['value']
-            elif 'submissionNames' in item['proteinDescription']:
-                row['protein_name'] = item['proteinDescription']['submissionNames'][0]['fullName']['value']
-            else:
-                row['protein_name'] = 'N/A'
-        except (KeyError, TypeError, IndexError):
-            row['protein_name'] = 'N/A'
-        try:
-            row['gene_name'] = item['genes'][0]['geneName']['value']
-        except (KeyError, TypeError, IndexError): 
-            row['gene_name'] = 'N/A'
-
-        try:
-            row['sequence_length'] = item.get('sequence_length', item.get('sequence', {}).get('length', 'N/A'))
-        except (KeyError, TypeError):
-            row['sequence_length'] = 'N/A'
-
-        try:
-            if item['mRNA']:
-                row['mRNA'] = item['mRNA']
-            else:
-                row['mRNA'] = ''
-        except (KeyError, TypeError):
-            row['mRNA'] = ''
-
-
-        rows.append(row)
-
     with ui.element('div').style('overflow-y: auto; max-height: 40vh; width: 100%;'):
-        ui.table(
+        return ui.table(
             columns=columns,
-            rows=rows,
+            rows=[uniprot_row(item) for item in data],
             row_key='accession',
         ).classes('w-full')
 
+def uniprot_row(record):
+    entry_type = record.entry_type or 'N/A'
+    prefix = 'sp' if entry_type == 'SwissProt' else 'tr'
+    return {
+        'entry_type': entry_type,
+        'accession': f"{prefix}|{record.accession or 'N/A'}|{record.entry_name or 'N/A'}",
+        'taxid': record.taxid or 'N/A',
+        'scientific_name': record.scientific_name or 'N/A',
+        'protein_name': record.protein_name or 'N/A',
+        'gene_name': record.gene_name or 'N/A',
+        'sequence_length': record.sequence_length,
+        'mRNA': record.mRNA or '',
+    }
+
 def create_ncbi_table(data, mode):
     columns = [
         {'name': 'database', 'label': 'Database', 'field': 'database', 'sortable': True, 'align': 'left', 'style': 'width: 5%; text-align: left; white-space: nowrap; overflow: hidden; text-overflow: ellipsis;'},
@@ -126,32 +119,28 @@ def create_ncbi_table(data, mode):
 
         ])
         
-    rows = []
-    for item in data:
-        row = {
-            'database': item.get('database', 'NCBI'),
-            'accession': item.get('accession', 'N/A'),
-            'taxid': item.get('taxid', 'N/A'),
-            'scientific_name': item.get('scientific_name', 'N/A'),
-        }
-        
-        if mode == 'protein':
-            row.update({
-                'protein_name': item.get('protein_name', 'N/A'),
-                'sequence_length': item.get('sequence_length', 'N/A'),
-                'mRNA': item.get('mRNA', ''),
-            })
-        else:
-            row.update({
-                'gene_name': item.get('gene_name', 'N/A'),
-                'sequence_length': item.get('sequence_length', 'N/A'),
-            })
-        
-        rows.append(row)
-
     with ui.element('div').style('overflow-y: auto; max-height: 40vh; width: 100%;'):
-        ui.table(
+        return ui.table(
             columns=columns,
-            rows=rows,
+            rows=[ncbi_row(item, mode) for item in data],
             row_key='accession',
         ).classes('w-full')
+
+def ncbi_row(record, mode):
+    row = {
+        'database': record.database,
+        'accession': record.accession,
+        'taxid': record.taxid or 'N/A',
+        'scientific_name': record.scientific_name or 'N/A',
+        'sequence_length': record.sequence_length,
+    }
+    
+    if mode == 'protein':
+        row.update({
+            'protein_name': record.protein_name or 'N/A',
+            'mRNA': record.mRNA or '',
+        })
+    else:
+        row['gene_name'] = record.gene_name or 'N/A'
+    
+    return row
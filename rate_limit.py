@@ -0,0 +1,154 @@
+import asyncio
+import random
+import threading
+import time
+import httpx
+import config
+
+# Responses worth retrying: rate limiting and transient server errors
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+class RateGovernor:
+    """
+    Token bucket shared by every request to one upstream, whether it comes from
+    a coroutine or a worker thread, and so by every user session of the process
+    The rate is halved when the upstream answers 429 (pausing for Retry-After
+    when given) and grows back gradually with successful responses
+    """
+    def __init__(self, name, rate, burst=1):
+        self.name = name
+        self.max_rate = rate
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def reserve(self):
+        """
+        Take a token and return how long to wait before using it
+        """
+        with self.lock:
+            self.refill()
+            self.tokens -= 1
+            return max(0.0, -self.tokens / self.rate)
+
+    def refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self):
+        delay = self.reserve()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def acquire_sync(self):
+        delay = self.reserve()
+        if delay > 0:
+            time.sleep(delay)
+
+    def slow_down(self, retry_after=None):
+        with self.lock:
+            self.refill()
+            self.rate = max(self.max_rate / 8, self.rate / 2)
+            if retry_after:
+                # Pause by emptying the bucket for retry_after seconds, so that
+                # the requests queued meanwhile resume one by one at the new rate
+                self.tokens = min(self.tokens, 1 - retry_after * self.rate)
+        print(f"{self.name} rate limited, slowing down to {self.rate:.2f} requests/s")
+
+    def speed_up(self):
+        if self.rate < self.max_rate:
+            with self.lock:
+                self.rate = min(self.max_rate, self.rate * 1.1)
+
+ncbi_governor = RateGovernor('NCBI', config.NCBI_REQUESTS_PER_SECOND)
+uniprot_governor = RateGovernor('UniProt', config.UNIPROT_REQUESTS_PER_SECOND)
+
+def parse_retry_after(response):
+    value = response.headers.get('Retry-After', '')
+    return float(value) if value.isdigit() else None
+
+def backoff_delay(attempt, retry_after=None):
+    if retry_after:
+        return retry_after
+    return min(30, 2 ** attempt) + random.uniform(0, 0.5)
+
+def should_retry(response, governor, attempt):
+    """
+    Whether a response must be retried, slowing the governor down on 429
+    Returns the delay before the next attempt, or None
+    """
+    if response.status_code not in RETRY_STATUS_CODES or attempt == config.HTTP_MAX_RETRIES:
+        return None
+    retry_after = parse_retry_after(response)
+    if response.status_code == 429:
+        governor.slow_down(retry_after)
+    print(f"{governor.name} answered {response.status_code}, retrying ({attempt + 1}/{config.HTTP_MAX_RETRIES})")
+    return backoff_delay(attempt, retry_after)
+
+async def governed_request(client, governor, method, url, **kwargs):
+    """
+    Send a request once the governor allows it, retrying on 429, 5xx and
+    connection errors with exponential backoff
+    """
+    for attempt in range(config.HTTP_MAX_RETRIES + 1):
+        await governor.acquire()
+        try:
+            response = await client.request(method, url, **kwargs)
+        except httpx.TransportError as e:
+            if attempt == config.HTTP_MAX_RETRIES:
+                raise
+            print(f"{governor.name} request failed ({e!r}), retrying ({attempt + 1}/{config.HTTP_MAX_RETRIES})")
+            await asyncio.sleep(backoff_delay(attempt))
+            continue
+
+        delay = should_retry(response, governor, attempt)
+        if delay is None:
+            governor.speed_up()
+            return response
+        await asyncio.sleep(delay)
+
+async def governed_stream(client, governor, method, url, consume, **kwargs):
+    """
+    Like governed_request for a streamed response: `consume` is awaited with
+    the response and the whole download is retried if the stream breaks
+    """
+    for attempt in range(config.HTTP_MAX_RETRIES + 1):
+        await governor.acquire()
+        try:
+            async with client.stream(method, url, **kwargs) as response:
+                delay = should_retry(response, governor, attempt)
+                if delay is None:
+                    response.raise_for_status()
+                    result = await consume(response)
+                    governor.speed_up()
+                    return result
+        except httpx.TransportError as e:
+            if attempt == config.HTTP_MAX_RETRIES:
+                raise
+            print(f"{governor.name} stream failed ({e!r}), retrying ({attempt + 1}/{config.HTTP_MAX_RETRIES})")
+            delay = backoff_delay(attempt)
+        await asyncio.sleep(delay)
+
+def governed_request_sync(client, governor, method, url, **kwargs):
+    """
+    Blocking counterpart of governed_request, for code running in worker threads
+    """
+    for attempt in range(config.HTTP_MAX_RETRIES + 1):
+        governor.acquire_sync()
+        try:
+            response = client.request(method, url, **kwargs)
+        except httpx.TransportError as e:
+            if attempt == config.HTTP_MAX_RETRIES:
+                raise
+            print(f"{governor.name} request failed ({e!r}), retrying ({attempt + 1}/{config.HTTP_MAX_RETRIES})")
+            time.sleep(backoff_delay(attempt))
+            continue
+
+        delay = should_retry(response, governor, attempt)
+        if delay is None:
+            governor.speed_up()
+            return response
+        time.sleep(delay)
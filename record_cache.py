@@ -0,0 +1,102 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import config
+
+class RecordCache:
+    """
+    SQLite store of parsed GenBank records keyed by database and accession.version
+    Records older than `ttl` seconds are treated as missing, and once the stored
+    records exceed `max_bytes` the least recently used ones are evicted
+    """
+    # SQLite limits the number of host parameters per statement
+    query_chunk_size = 500
+
+    def __init__(self, path, ttl, max_bytes):
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        with self.connection:
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS records ("
+                "database TEXT NOT NULL, accession TEXT NOT NULL, data TEXT NOT NULL, "
+                "size INTEGER NOT NULL, created REAL NOT NULL, accessed REAL NOT NULL, "
+                "PRIMARY KEY (database, accession))"
+            )
+            self.connection.execute("CREATE INDEX IF NOT EXISTS records_accessed ON records (accessed)")
+
+    def get_many(self, database, accessions):
+        """
+        Return {accession: record} for the accessions found and still fresh
+        """
+        found = {}
+        now = time.time()
+        with self.lock, self.connection:
+            for i in range(0, len(accessions), self.query_chunk_size):
+                chunk = accessions[i:i + self.query_chunk_size]
+                placeholders = ','.join('?' * len(chunk))
+                rows = self.connection.execute(
+                    f"SELECT accession, data FROM records "
+                    f"WHERE database = ? AND created >= ? AND accession IN ({placeholders})",
+                    [database, now - self.ttl, *chunk]
+                ).fetchall()
+                for accession, data in rows:
+                    found[accession] = json.loads(data)
+
+                self.connection.execute(
+                    f"UPDATE records SET accessed = ? WHERE database = ? AND accession IN ({placeholders})",
+                    [now, database, *chunk]
+                )
+        return found
+
+    def put_many(self, database, records):
+        if not records:
+            return
+
+        now = time.time()
+        rows = []
+        for record in records:
+            data = json.dumps(record)
+            rows.append((database, record['accession'], data, len(data), now, now))
+
+        with self.lock, self.connection:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO records (database, accession, data, size, created, accessed) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                rows
+            )
+            self.evict(now)
+
+    def evict(self, now):
+        """
+        Drop expired records, then the least recently used ones beyond max_bytes
+        """
+        self.connection.execute("DELETE FROM records WHERE created < ?", (now - self.ttl,))
+        total_size = self.connection.execute("SELECT COALESCE(SUM(size), 0) FROM records").fetchone()[0]
+        if total_size > self.max_bytes:
+            self.connection.execute(
+                "DELETE FROM records WHERE rowid IN ("
+                "SELECT rowid FROM (SELECT rowid, SUM(size) OVER (ORDER BY accessed DESC, rowid DESC) AS kept "
+                "FROM records) WHERE kept > ?)",
+                (self.max_bytes,)
+            )
+
+record_cache = None
+
+def get_record_cache():
+    """
+    Return the process-wide record cache, or None when caching is disabled
+    """
+    global record_cache
+    if not config.RECORD_CACHE_ENABLED:
+        return None
+    if record_cache is None:
+        record_cache = RecordCache(config.RECORD_CACHE_PATH, config.RECORD_CACHE_TTL, config.RECORD_CACHE_MAX_BYTES)
+    return record_cache
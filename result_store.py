@@ -0,0 +1,221 @@
+import hashlib
+import sys
+from array import array
+from sequence_store import get_sequence_store
+
+# Source codes of the `sources` column
+SOURCES = ('UniProtKB', 'NCBI')
+SOURCE_CODES = {source: code for code, source in enumerate(SOURCES)}
+
+class SearchRecord:
+    """
+    One search hit, UniProtKB protein, NCBI protein or NCBI mRNA, in the schema
+    shared by both databases. Fields that do not apply stay None
+    """
+    __slots__ = (
+        'database', 'entry_type', 'accession', 'entry_name', 'taxid', 'scientific_name',
+        'protein_name', 'gene_name', 'sequence_length', 'mRNA', 'mrna_pending', 'sequence_ref', 'merged_accessions'
+    )
+
+    def __init__(self, database, accession, taxid=None, scientific_name=None, protein_name=None, gene_name=None,
+                 sequence_length=0, mRNA=None, sequence=None, entry_type=None, entry_name=None):
+        self.database = database
+        self.entry_type = entry_type
+        self.accession = accession
+        self.entry_name = entry_name
+        self.taxid = taxid
+        # Organism names repeat across thousands of hits
+        self.scientific_name = sys.intern(scientific_name) if scientific_name else None
+        self.protein_name = protein_name
+        self.gene_name = gene_name
+        self.sequence_length = sequence_length or 0
+        self.mRNA = mRNA
+        self.mrna_pending = False  # mRNA not looked up yet (lean UniProtKB projection)
+        self.sequence = sequence
+        self.merged_accessions = None
+
+    def copy(self):
+        """
+        Shallow copy, for a session to change without affecting the cached search
+        """
+        record = SearchRecord.__new__(SearchRecord)
+        for name in self.__slots__:
+            setattr(record, name, getattr(self, name))
+        return record
+
+    @property
+    def sequence(self):
+        """
+        The sequence is kept in the session sequence store, not in the record
+        """
+        if self.sequence_ref is None:
+            return None
+        return get_sequence_store().get(self.sequence_ref)
+
+    @sequence.setter
+    def sequence(self, sequence):
+        self.sequence_ref = get_sequence_store().put(sequence) if sequence is not None else None
+
+    def sequence_view(self):
+        """
+        Zero-copy view of the sequence bytes, or None
+        """
+        if self.sequence_ref is None:
+            return None
+        return get_sequence_store().view(self.sequence_ref)
+
+    def to_dict(self, with_sequence=True):
+        """
+        Flat NCBI-style record, as sent to the FASTA server
+        """
+        record = {
+            'accession': self.accession,
+            'scientific_name': self.scientific_name,
+            'taxid': self.taxid or 'N/A',
+            'sequence_length': self.sequence_length,
+            'database': self.database
+        }
+        if self.gene_name is not None and self.protein_name is None:
+            record['gene_name'] = self.gene_name
+        else:
+            record['protein_name'] = self.protein_name
+            record['mRNA'] = self.mRNA
+        if self.merged_accessions:
+            record['merged_accessions'] = self.merged_accessions
+        if with_sequence:
+            record['sequence'] = self.sequence
+        return record
+
+    def sequence_digest(self):
+        """
+        Hash of the sequence, None when there is none or it is empty
+        """
+        view = self.sequence_view()
+        return hashlib.blake2b(view, digest_size=16).digest() if view else None
+
+def record_from_ncbi(record):
+    """
+    SearchRecord from a record of ncbi.py (dict with NCBI GenBank fields)
+    """
+    taxid = record.get('taxid')
+    return SearchRecord(
+        'NCBI',
+        record.get('accession', 'N/A'),
+        taxid=taxid if isinstance(taxid, int) else None,
+        scientific_name=record.get('scientific_name'),
+        protein_name=record.get('protein_name'),
+        gene_name=record.get('gene_name'),
+        sequence_length=record.get('sequence_length', 0),
+        mRNA=record.get('mRNA'),
+        sequence=record.get('sequence')
+    )
+
+def deduplicate_sequences(records):
+    """
+    Collapse records with the same sequence in the same taxon into the first
+    one, which lists the accessions of the others in merged_accessions
+    Records without a local sequence, or with an empty one, are kept as they are
+    Returns the representatives, in the original order
+    """
+    representatives = {}
+    kept = []
+    for record in records:
+        record.merged_accessions = None
+        digest = record.sequence_digest()
+        if digest is None:
+            kept.append(record)
+            continue
+        
+        key = (digest, record.taxid)
+        representative = representatives.get(key)
+        if representative is None:
+            representatives[key] = record
+            kept.append(record)
+        else:
+            if representative.merged_accessions is None:
+                representative.merged_accessions = []
+            representative.merged_accessions.append(record.accession)
+    return kept
+
+class ResultStore:
+    """
+    Search results of one session: the records plus array columns for the
+    fields that selections filter and count on (source, taxid, length)
+    The columns are filled when records are added, so taxids must be final
+    (rank already resolved) by then
+    """
+    def __init__(self, records=()):
+        self.records = []
+        self.sources = array('B')
+        self.taxids = array('l')
+        self.lengths = array('l')
+        self.extend(records)
+
+    def extend(self, records):
+        for record in records:
+            self.records.append(record)
+            self.sources.append(SOURCE_CODES[record.database])
+            self.taxids.append(record.taxid or 0)
+            self.lengths.append(record.sequence_length)
+
+    def __len__(self):
+        return len(self.records)
+
+    def __iter__(self):
+        return iter(self.records)
+
+    def __bool__(self):
+        return bool(self.records)
+
+    def count(self, database):
+        return self.sources.count(SOURCE_CODES[database])
+
+    def species_count(self, database=None):
+        """
+        Number of distinct taxids, records without taxid counting as one species
+        """
+        if database is None:
+            return len(set(self.taxids))
+        code = SOURCE_CODES[database]
+        return len({taxid for source, taxid in zip(self.sources, self.taxids) if source == code})
+
+    def select(self, database=None, having_mrna=False, min_length=None, max_length=None):
+        """
+        Indices of the records matching every given criterion, as a selection
+        sharing the records of the store
+        """
+        code = SOURCE_CODES[database] if database else None
+        sources, lengths, records = self.sources, self.lengths, self.records
+        indices = array('l', (
+            i for i in range(len(records))
+            if (code is None or sources[i] == code)
+            and (min_length is None or lengths[i] >= min_length)
+            and (max_length is None or lengths[i] <= max_length)
+            and (not having_mrna or records[i].mRNA)
+        ))
+        return ResultSelection(self, indices)
+
+class ResultSelection:
+    """
+    Subset of a ResultStore, kept as record indices
+    """
+    __slots__ = ('store', 'positions')
+
+    def __init__(self, store, positions):
+        self.store = store
+        self.positions = positions
+
+    def __len__(self):
+        return len(self.positions)
+
+    def __iter__(self):
+        records = self.store.records
+        return (records[i] for i in self.positions)
+
+    def __bool__(self):
+        return len(self.positions) > 0
+
+    @property
+    def lengths(self):
+        lengths = self.store.lengths
+        return array('l', (lengths[i] for i in self.positions))
@@ -1,13 +1,20 @@
 import asyncio
+import time
 import traceback
 from nicegui import ui
 import config
-from uniprot import fetch_taxonomy, fetch_uniprot_data, fetch_rank
+from uniprot import fetch_taxonomy, fetch_uniprot_data, fetch_ranks
 from ncbi import fetch_ncbi_proteins, fetch_ncbi_genes
+from protein_gene_table import create_protein_table, create_gene_table, add_table_rows, finish_tables
+from sequence_selection import show_sequence_selection_form, initialize_sequence_data, update_length_chart
+from result_store import ResultStore, SearchRecord
+from sequence_store import get_sequence_store
+from search_cache import search_cache, search_key
+from search_plan import plan_protein_search, plan_gene_search, needs_confirmation, confirm_search_plan
 
 current_search_task = None
 
-async def search_genes(gene_name, taxonomy_name, selected_rank):
+async def search_genes(gene_name, taxonomy_name, selected_rank, metadata_only=False):
     global current_search_task
     
     if not gene_name:
@@ -23,39 +30,59 @@ async def search_genes(gene_name, taxonomy_name, selected_rank):
         config.search_params['uniprot'] = False
         config.search_params['ncbi'] = True
         config.search_params['term'] = gene_name
-        gene_rank_dict = {}
+        config.search_params['metadata_only'] = metadata_only
         
-        loop = asyncio.get_event_loop()
+        taxid = await resolve_taxid(taxonomy_name)
+        config.search_params['taxid'] = taxid
         
-        ui.notify('Searching in NCBI...', color='info')
-        taxo = await loop.run_in_executor(None, fetch_taxonomy, taxonomy_name) if taxonomy_name else None
-        taxid = taxo['taxid'] if taxo else None
-        config.search_params['taxid'] = taxid     
+        # Large searches are confirmed, capped or cancelled before fetching
+        confirmed, max_results = await confirm_large_search(
+            search_key('gene', gene_name, taxid, selected_rank, metadata_only),
+            lambda: plan_gene_search(gene_name, taxid, metadata_only)
+        )
+        if not confirmed:
+            reset_search_state()
+            ui.notify('Search cancelled, narrow the query and search again.', color='info')
+            return {'success': False, 'error': 'Search cancelled before fetching'}
         
-        # Fetch genes from NCBI
-        ncbi_genes = await loop.run_in_executor(None, fetch_ncbi_genes, gene_name, taxid)        
-        ncbi_genes_correct_rank = await update_taxonomic_rank(
-            ncbi_genes, gene_rank_dict, selected_rank, 'taxid', 'scientific_name'
+        # Identical searches of every session share one run and its cached results
+        flight = search_cache.flight(
+            search_key('gene', gene_name, taxid, selected_rank, metadata_only, max_results),
+            lambda: gene_search_events(gene_name, taxid, selected_rank, metadata_only, max_results)
         )
         
-        print("NCBI search completed.")
-        config.ncbi_genes = ncbi_genes_correct_rank
+        # Display results as they arrive
+        counts_markdown = show_search_header(gene_name, taxonomy_name)
+        create_gene_table()
         config.selected_data = config.ncbi_genes
-
-        # Count species
-        ncbi_species_count = count_species(config.ncbi_genes, 'taxid')
-
-        # Display results
-        with config.table_container:
-            ui.label('Search Results').classes(f'text-2xl font-bold text-[{config.VIOLET_COLOR}]')
-            search_results_text = f'Search results for "{gene_name}"'
-            if taxonomy_name:
-                search_results_text += f' in taxonomy "{taxonomy_name}"'
-            ui.markdown(search_results_text)
-            ui.markdown(
+        show_sequence_selection_form()
+        
+        def counts_text():
+            return (
                 f'Found **{len(config.ncbi_genes)}** entries '
-                f'in **{ncbi_species_count}** species '
+                f'in **{config.ncbi_genes.species_count()}** species '
             )
+        
+        last_refresh = time.monotonic()
+        async for kind, value in flight.subscribe():
+            if kind == 'stage':
+                ui.notify(f'Searching in {value}...', color='info')
+            elif kind == 'incomplete':
+                notify_incomplete(value)
+            else:
+                # The session changes its records, the cached ones stay as fetched
+                records = [record.copy() for record in value]
+                config.ncbi_genes.extend(records)
+                add_table_rows('ncbi', records)
+                
+                if time.monotonic() - last_refresh >= config.RESULTS_REFRESH_INTERVAL:
+                    refresh_search_results(counts_markdown, counts_text(), config.ncbi_genes)
+                    last_refresh = time.monotonic()
+        
+        print("NCBI search completed.")
+        refresh_search_results(counts_markdown, counts_text(), config.ncbi_genes)
+        finish_tables()
+        initialize_sequence_data()
 
         # Finish search successfully
         finish_search(success=True)
@@ -64,9 +91,9 @@ async def search_genes(gene_name, taxonomy_name, selected_rank):
             'success': True,
             'gene_name': gene_name,
             'taxonomy_name': taxonomy_name,
-            'ncbi_genes': ncbi_genes_correct_rank,
-            'ncbi_species_count': ncbi_species_count,
-            'total_species': ncbi_species_count
+            'ncbi_genes': config.ncbi_genes,
+            'ncbi_species_count': config.ncbi_genes.species_count(),
+            'total_species': config.ncbi_genes.species_count()
         }
                                  
     except asyncio.CancelledError:
@@ -80,18 +107,14 @@ async def search_genes(gene_name, taxonomy_name, selected_rank):
         print("Full traceback:")
         print(traceback.format_exc())
         
-        # Display error in UI
-        config.table_container.clear()
-        error_message = f"**Error:** {str(e)}\n\n**Traceback:**\n```\n{traceback.format_exc()}\n```"
-        with config.table_container:
-            ui.markdown(error_message)
+        show_search_error(e)
             
         # Finish search with error
         finish_search(success=True)  # Show table with error message
         
         return {'success': False, 'error': str(e)}
 
-async def search_protein(protein_name, taxonomy_name, selected_rank):
+async def search_protein(protein_name, taxonomy_name, selected_rank, metadata_only=False):
     global current_search_task
     
     if not protein_name:
@@ -110,75 +133,66 @@ async def search_protein(protein_name, taxonomy_name, selected_rank):
         config.search_params['uniprot'] = True
         config.search_params['ncbi'] = True
         config.search_params['term'] = protein_name
-        protein_rank_dict = {}
-        
-        loop = asyncio.get_event_loop()
+        config.search_params['metadata_only'] = metadata_only
         
-        # Get taxonomy if specified
-        taxo = await loop.run_in_executor(None, fetch_taxonomy, taxonomy_name) if taxonomy_name else None
-        taxid = taxo['taxid'] if taxo else None
+        taxid = await resolve_taxid(taxonomy_name)
         config.search_params['taxid'] = taxid
         
-        # Search in UniProt
-        ui.notify('Searching in UniProtKB...', color='info')
-        uniprot_proteins = await loop.run_in_executor(None, fetch_uniprot_data, protein_name, taxid)
-                
-        # Update taxonomic ranks for UniProt proteins
-        uniprot_proteins_correct_rank = await update_taxonomic_rank(
-            uniprot_proteins, protein_rank_dict, selected_rank, 'organism.taxonId', 'organism.scientificName'
+        # Large searches are confirmed, capped or cancelled before fetching
+        confirmed, max_results = await confirm_large_search(
+            search_key('protein', protein_name, taxid, selected_rank, metadata_only),
+            lambda: plan_protein_search(protein_name, taxid, metadata_only)
         )
+        if not confirmed:
+            reset_search_state()
+            ui.notify('Search cancelled, narrow the query and search again.', color='info')
+            return {'success': False, 'error': 'Search cancelled before fetching'}
         
-        # Add mRNA information for UniProt proteins
-        for prot in uniprot_proteins_correct_rank:
-            original_crossrefs = prot.get('uniProtKBCrossReferences', [])
-            nucleotide_ref = extract_nucleotide_reference(original_crossrefs)
-            prot['mRNA'] = nucleotide_ref
-            
-        print("UniProt search completed.")
-        
-        # Search in NCBI
-        ui.notify('Searching in NCBI...', color='info')
-        ncbi_proteins = await loop.run_in_executor(None, fetch_ncbi_proteins, protein_name, taxid)
-        
-        # Update taxonomic ranks for NCBI proteins
-        ncbi_proteins_correct_rank = await update_taxonomic_rank(
-            ncbi_proteins, protein_rank_dict, selected_rank, 'taxid', 'scientific_name'
+        # Identical searches of every session share one run and its cached results
+        flight = search_cache.flight(
+            search_key('protein', protein_name, taxid, selected_rank, metadata_only, max_results),
+            lambda: protein_search_events(protein_name, taxid, selected_rank, metadata_only, max_results)
         )
         
-        print("NCBI search completed.")
-        
-        # Store results in config
-        config.uniprot_proteins = uniprot_proteins_correct_rank
-        config.ncbi_proteins = ncbi_proteins_correct_rank
-        config.all_proteins = uniprot_proteins_correct_rank + ncbi_proteins_correct_rank
+        # Display results as they arrive
+        counts_markdown = show_search_header(protein_name, taxonomy_name)
+        create_protein_table()
         config.selected_data = config.all_proteins
-
-        # Count species
-        uniprot_species_count = count_species(config.uniprot_proteins, 'organism.taxonId')
-        ncbi_species_count = count_species(config.ncbi_proteins, 'taxid')
+        show_sequence_selection_form()
         
-        # Count total unique species
-        all_taxids = set()
-        for protein in config.all_proteins:
-            taxid = protein.get('organism', {}).get('taxonId') or protein.get('taxid', 'Unknown')
-            all_taxids.add(taxid)
-        total_species = len(all_taxids)
-
-        # Display results
-        with config.table_container:
-            ui.label('Search Results').classes(f'text-2xl font-bold text-[{config.VIOLET_COLOR}]')
-            search_results_text = f'Search results for "{protein_name}"'
-            if taxonomy_name:
-                search_results_text += f' in taxonomy "{taxonomy_name}"'
-            ui.markdown(search_results_text)
-            ui.markdown(
-                f'Found **{len(config.uniprot_proteins)}** UniProtKB entries '
-                f'in **{uniprot_species_count}** species and '
-                f'**{len(config.ncbi_proteins)}** NCBI entries '
-                f'in **{ncbi_species_count}** species '
+        def counts_text():
+            return (
+                f'Found **{config.all_proteins.count("UniProtKB")}** UniProtKB entries '
+                f'in **{config.all_proteins.species_count("UniProtKB")}** species and '
+                f'**{config.all_proteins.count("NCBI")}** NCBI entries '
+                f'in **{config.all_proteins.species_count("NCBI")}** species '
                 f'(Total: **{len(config.all_proteins)}** '
-                f'in **{total_species}** unique species)'
+                f'in **{config.all_proteins.species_count()}** unique species)'
             )
+        
+        last_refresh = time.monotonic()
+        async for kind, value in flight.subscribe():
+            if kind == 'stage':
+                if value == 'NCBI':
+                    print("UniProt search completed.")
+                    refresh_search_results(counts_markdown, counts_text(), config.all_proteins)
+                ui.notify(f'Searching in {value}...', color='info')
+            elif kind == 'incomplete':
+                notify_incomplete(value)
+            else:
+                # The session changes its records, the cached ones stay as fetched
+                records = [record.copy() for record in value]
+                config.all_proteins.extend(records)
+                add_table_rows('uniprot' if kind == 'UniProtKB' else 'ncbi', records)
+                
+                if time.monotonic() - last_refresh >= config.RESULTS_REFRESH_INTERVAL:
+                    refresh_search_results(counts_markdown, counts_text(), config.all_proteins)
+                    last_refresh = time.monotonic()
+        
+        print("NCBI search completed.")
+        refresh_search_results(counts_markdown, counts_text(), config.all_proteins)
+        finish_tables()
+        initialize_sequence_data()
 
         # Finish search successfully
         finish_search(success=True)
@@ -187,11 +201,10 @@ async def search_protein(protein_name, taxonomy_name, selected_rank):
             'success': True,
             'protein_name': protein_name,
             'taxonomy_name': taxonomy_name,
-            'uniprot_proteins': uniprot_proteins_correct_rank,
-            'ncbi_proteins': ncbi_proteins_correct_rank,
-            'uniprot_species_count': uniprot_species_count,
-            'ncbi_species_count': ncbi_species_count,
-            'total_species': total_species
+            'proteins': config.all_proteins,
+            'uniprot_species_count': config.all_proteins.species_count('UniProtKB'),
+            'ncbi_species_count': config.all_proteins.species_count('NCBI'),
+            'total_species': config.all_proteins.species_count()
         }
     
     except asyncio.CancelledError:
@@ -205,16 +218,122 @@ async def search_protein(protein_name, taxonomy_name, selected_rank):
         print("Full traceback:")
         print(traceback.format_exc())
         
-        # Display error in UI
-        config.table_container.clear()
-        error_message = f"**Error:** {str(e)}\n\n**Traceback:**\n```\n{traceback.format_exc()}\n```"
-        with config.table_container:
-            ui.markdown(error_message)
+        show_search_error(e)
             
         # Finish search with error
         finish_search(success=True)  # Show table with error message
         
         return {'success': False, 'error': str(e)}
+
+# =============================================================================
+# SEARCH RUNS (shared between sessions, see search_cache.py)
+# =============================================================================
+
+async def resolve_taxid(taxonomy_name):
+    loop = asyncio.get_event_loop()
+    taxo = await loop.run_in_executor(None, fetch_taxonomy, taxonomy_name) if taxonomy_name else None
+    return taxo['taxid'] if taxo else None
+
+async def confirm_large_search(key, planner):
+    """
+    Count the hits of a search that is not cached yet and, if it is large,
+    show its estimated cost so that the user confirms, caps or cancels it
+    Returns (confirmed, max_results), see confirm_search_plan
+    """
+    if search_cache.get(key) is not None:
+        return True, None
+    
+    plan = await planner()
+    print("Search plan: " + ", ".join(f"{source['database']} {source['hits']} hits" for source in plan))
+    if not needs_confirmation(plan):
+        return True, None
+    
+    config.loading_spinner.set_visibility(False)
+    confirmed, max_results = await confirm_search_plan(plan)
+    config.loading_spinner.set_visibility(confirmed)
+    return confirmed, max_results
+
+async def gene_search_events(gene_name, taxid, selected_rank, metadata_only, max_results=None):
+    """
+    Run a gene search, yielding (kind, value) events: the 'stage' being
+    searched, then batches of 'NCBI' records with their rank already resolved,
+    and 'incomplete' if some of them could not be retrieved
+    """
+    gene_rank_dict = {}
+    failures = []
+    
+    # Fetch genes from NCBI
+    yield 'stage', 'NCBI'
+    async for ncbi_genes in fetch_ncbi_genes(gene_name, taxid, max_results, metadata_only=metadata_only, failures=failures):
+        yield 'NCBI', await update_taxonomic_rank(ncbi_genes, gene_rank_dict, selected_rank)
+    if failures:
+        yield 'incomplete', 'NCBI'
+
+async def protein_search_events(protein_name, taxid, selected_rank, metadata_only, max_results=None):
+    """
+    Run a protein search, yielding (kind, value) events: the 'stage' being
+    searched, then batches of 'UniProtKB' and 'NCBI' records with their rank
+    already resolved, and 'incomplete' for a source whose results could not
+    all be retrieved. max_results caps the results of each source
+    """
+    protein_rank_dict = {}
+    uniprot_failures = []
+    ncbi_failures = []
+    
+    # NCBI proteins cross-referenced by the UniProt entries, not fetched again from NCBI
+    covered_accessions = set() if config.SKIP_UNIPROT_COVERED_NCBI else None
+    
+    # Search in UniProt
+    yield 'stage', 'UniProtKB'
+    async for uniprot_proteins in fetch_uniprot_data(
+        protein_name, taxid, covered_accessions=covered_accessions, max_results=max_results, failures=uniprot_failures
+    ):
+        yield 'UniProtKB', await update_taxonomic_rank(uniprot_proteins, protein_rank_dict, selected_rank)
+    if uniprot_failures:
+        yield 'incomplete', 'UniProtKB'
+    
+    # Search in NCBI
+    yield 'stage', 'NCBI'
+    async for ncbi_proteins in fetch_ncbi_proteins(
+        protein_name, taxid, max_results, metadata_only=metadata_only, exclude_accessions=covered_accessions,
+        failures=ncbi_failures
+    ):
+        yield 'NCBI', await update_taxonomic_rank(ncbi_proteins, protein_rank_dict, selected_rank)
+    if ncbi_failures:
+        yield 'incomplete', 'NCBI'
+
+def notify_incomplete(database):
+    ui.notify(
+        f'Some {database} results could not be retrieved, search again to resume.',
+        color='warning'
+    )
+
+def show_search_header(term, taxonomy_name):
+    """
+    Title of the results, returns the markdown element holding the counts
+    """
+    with config.table_container:
+        ui.label('Search Results').classes(f'text-2xl font-bold text-[{config.VIOLET_COLOR}]')
+        search_results_text = f'Search results for "{term}"'
+        if taxonomy_name:
+            search_results_text += f' in taxonomy "{taxonomy_name}"'
+        ui.markdown(search_results_text)
+        counts_markdown = ui.markdown('Searching...')
+    config.table_container.set_visibility(True)
+    return counts_markdown
+
+def refresh_search_results(counts_markdown, counts_text, data_items):
+    counts_markdown.set_content(counts_text)
+    update_length_chart(data_items, None, None)
+
+def show_search_error(e):
+    config.sequence_selection_container.clear()
+    config.sequence_selection_container.set_visibility(False)
+    
+    config.table_container.clear()
+    error_message = f"**Error:** {str(e)}\n\n**Traceback:**\n```\n{traceback.format_exc()}\n```"
+    with config.table_container:
+        ui.markdown(error_message)
         
 def reset_search_state():
     config.table_container.clear()
@@ -238,10 +357,8 @@ def reset_search_state():
     config.pipeline2_results.clear()
     config.pipeline2_results.set_visibility(False)
     
-    config.uniprot_proteins = []
-    config.ncbi_proteins = []
-    config.ncbi_genes = []
-    config.all_proteins = []
+    config.ncbi_genes = ResultStore()
+    config.all_proteins = ResultStore()
     
     config.loading_spinner.set_visibility(False)
 
@@ -260,97 +377,67 @@ def finish_search(success=True):
     config.loading_spinner.set_visibility(False)
     if success:
         config.table_container.set_visibility(True)
+    release_sequences()
 
-def extract_nucleotide_reference(cross_references):
-    if not cross_references:
-        return None
+def release_sequences():
+    """
+    Compact the sequence store once most of it holds sequences that neither
+    the cached searches nor the session reference anymore
+    Skipped while a search runs, as its records are not all reachable yet
+    """
+    search_cache.prune()
+    if search_cache.busy():
+        return
     
-    refseq_ref = None
-    mrna_ref = None
+    # A set, records shared by several holders are moved once
+    records = {
+        record
+        for records in (
+            search_cache.records(), config.all_proteins or (), config.ncbi_genes or (),
+            config.selected_data or (), getattr(config, 'database_selected_data', None) or ()
+        )
+        for record in records
+        if isinstance(record, SearchRecord) and record.sequence_ref is not None
+    }
+    references = [record.sequence_ref for record in records]
+    if config.custom_fasta_content is not None:
+        references.append(config.custom_fasta_content)
     
-    for ref in cross_references:
-        database = ref.get('database', '')
-        ref_id = ref.get('id', '')
-        
-        if database == 'RefSeq':
-            properties = ref.get('properties', [])
-            for prop in properties:
-                if prop.get('key') == 'NucleotideSequenceId':
-                    refseq_ref = prop.get('value')
-            
-        elif database == 'EMBL':
-            properties = ref.get('properties', [])
-            for prop in properties:
-                if prop.get('key') == 'MoleculeType' and prop.get('value') == 'mRNA':
-                    mrna_ref = ref_id
-                    break
-    
-    return refseq_ref or mrna_ref
+    store = get_sequence_store()
+    live_bytes = sum(length for _, length, _ in set(references))
+    if store.size - live_bytes <= live_bytes:
+        return
+    
+    moved = store.compact(references)
+    for record in records:
+        record.sequence_ref = moved.get(record.sequence_ref, record.sequence_ref)
+    if config.custom_fasta_content is not None:
+        config.custom_fasta_content = moved.get(config.custom_fasta_content, config.custom_fasta_content)
+    print(f"Sequence store compacted to {store.size} bytes")
 
-async def update_taxonomic_rank(items, rank_dict, selected_rank, taxid_key, name_key):
-    loop = asyncio.get_event_loop()
-    processed_items = []
-    
-    for item in items:
-        if '.' in taxid_key:
-            keys = taxid_key.split('.')
-            taxid = item
-            for key in keys:
-                taxid = taxid.get(key) if isinstance(taxid, dict) else None
-        else:
-            taxid = item.get(taxid_key)
-            
-        if '.' in name_key:
-            keys = name_key.split('.')
-            scientific_name = item
-            for key in keys:
-                scientific_name = scientific_name.get(key) if isinstance(scientific_name, dict) else None
-        else:
-            scientific_name = item.get(name_key)
-        
-        # Only process rank if the scientific name has more than 2 words (not species level)
-        if scientific_name and scientific_name.count(' ') > 1:
-            if taxid in rank_dict:
-                updated_taxid, updated_scientific_name = rank_dict[taxid]
-            else:
-                updated_taxid, updated_scientific_name = await loop.run_in_executor(None, fetch_rank, taxid, selected_rank)
-                rank_dict[taxid] = (updated_taxid, updated_scientific_name)
-            
+async def update_taxonomic_rank(records, rank_dict, selected_rank):
+    """
+    Move records below the selected rank up to their ancestor at that rank
+    Records whose ancestor cannot be found are left out
+    The taxids not in rank_dict yet are resolved together, see fetch_ranks
+    """
+    # Only process rank if the scientific name has more than 2 words (not species level)
+    below_rank = [
+        record.scientific_name is not None and record.scientific_name.count(' ') > 1
+        for record in records
+    ]
+    missing_taxids = {record.taxid for record, below in zip(records, below_rank) if below and record.taxid not in rank_dict}
+    if missing_taxids:
+        rank_dict.update(await fetch_ranks(missing_taxids, selected_rank))
+    
+    processed_records = []
+    for record, below in zip(records, below_rank):
+        if below:
+            updated_taxid, updated_scientific_name = rank_dict[record.taxid]
             if not updated_taxid:
                 continue
-                
-            if '.' in taxid_key:
-                keys = taxid_key.split('.')
-                target = item
-                for key in keys[:-1]:
-                    target = target[key]
-                target[keys[-1]] = updated_taxid
-            else:
-                item[taxid_key] = updated_taxid
-                
-            if '.' in name_key:
-                keys = name_key.split('.')
-                target = item
-                for key in keys[:-1]:
-                    target = target[key]
-                target[keys[-1]] = updated_scientific_name
-            else:
-                item[name_key] = updated_scientific_name
-        
-        processed_items.append(item)
+            record.taxid = updated_taxid
+            record.scientific_name = updated_scientific_name
+        processed_records.append(record)
     
-    return processed_items
-
-def count_species(items, taxid_key):
-    taxids = set()
-    for item in items:
-        if '.' in taxid_key:
-            keys = taxid_key.split('.')
-            taxid = item
-            for key in keys:
-                taxid = taxid.get(key) if isinstance(taxid, dict) else None
-        else:
-            taxid = item.get(taxid_key)
-        taxids.add(taxid if taxid else 'Unknown')
-    return len(taxids)
-
+    return processed_records
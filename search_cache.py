@@ -0,0 +1,153 @@
+import asyncio
+import time
+from collections import OrderedDict
+import config
+
+class SearchFlight:
+    """
+    One run of a search, shared by every session asking for the same search
+    The producer runs once in its own task. Its events are kept as they
+    arrive, so that sessions joining late replay them before following the
+    live ones, and so that the finished flight serves as the cached result
+    A flight is cancelled when its last subscriber leaves before it finishes,
+    and one that could not retrieve every result (an 'incomplete' event) is
+    not cached, so that the next identical search resumes it
+    """
+    def __init__(self, producer):
+        self.events = []
+        self.done = False
+        self.error = None
+        self.incomplete = False
+        self.abandoned = False
+        self.subscribers = 0
+        self.finished = None
+        self.changed = asyncio.Event()
+        self.task = asyncio.ensure_future(self.run(producer))
+
+    async def run(self, producer):
+        try:
+            async for event in producer:
+                if event[0] == 'incomplete':
+                    self.incomplete = True
+                self.events.append(event)
+                self.notify()
+        except BaseException as e:
+            self.error = e
+            if isinstance(e, asyncio.CancelledError):
+                raise
+        finally:
+            self.done = True
+            self.finished = time.time()
+            self.notify()
+
+    def notify(self):
+        changed = self.changed
+        self.changed = asyncio.Event()
+        changed.set()
+
+    async def subscribe(self):
+        """
+        Yield every event of the search, from the first one
+        """
+        position = 0
+        self.subscribers += 1
+        try:
+            while True:
+                while position < len(self.events):
+                    yield self.events[position]
+                    position += 1
+                if self.done:
+                    if self.error:
+                        raise self.error
+                    return
+                await self.changed.wait()
+        finally:
+            self.subscribers -= 1
+            if self.subscribers == 0 and not self.done:
+                # Nobody follows the search anymore, stop it using the shared quotas
+                self.abandoned = True
+                self.task.cancel()
+
+class SearchResultCache:
+    """
+    Flights of the recent searches keyed by normalized query, in least
+    recently used order. Finished flights expire after `ttl` seconds, failed,
+    incomplete and abandoned ones are dropped, so that the next identical
+    search runs again
+    """
+    def __init__(self, ttl, max_entries):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.flights = OrderedDict()
+        self.running = set()  # Flights not finished yet, evicted or not
+
+    def get(self, key):
+        """
+        The flight running or cached for a key, or None
+        """
+        flight = self.flights.get(key)
+        if flight is not None and (
+            flight.error or flight.abandoned
+            or (flight.done and (flight.incomplete or time.time() - flight.finished > self.ttl))
+        ):
+            del self.flights[key]
+            flight = None
+        return flight
+
+    def flight(self, key, producer_factory):
+        """
+        Return the flight of a search, joining the one running or cached for
+        the same key, or starting `producer_factory()` otherwise
+        """
+        flight = self.get(key)
+        if flight is None:
+            flight = SearchFlight(producer_factory())
+            self.flights[key] = flight
+            self.running.add(flight)
+            # A flight evicted while running still serves its subscribers
+            while len(self.flights) > self.max_entries:
+                self.flights.popitem(last=False)
+        else:
+            self.flights.move_to_end(key)
+            print(f"Reusing {'cached' if flight.done else 'running'} search {key}")
+        return flight
+
+    def busy(self):
+        """
+        Whether a flight is still running. Checked on `done`, which its
+        subscribers see before the task itself completes
+        """
+        self.running = {flight for flight in self.running if not flight.done}
+        return bool(self.running)
+
+    def prune(self):
+        """
+        Drop the failed and expired flights
+        """
+        for key in list(self.flights):
+            self.get(key)
+
+    def records(self):
+        """
+        Records of the cached flights
+        """
+        for flight in self.flights.values():
+            for kind, value in flight.events:
+                if kind != 'stage':
+                    yield from value
+
+search_cache = SearchResultCache(config.SEARCH_RESULT_CACHE_TTL, config.SEARCH_RESULT_CACHE_SIZE)
+
+def search_key(search_type, term, taxid, selected_rank, metadata_only, max_results=None):
+    """
+    Normalize the search parameters so that trivially different spellings of
+    the same search share their results
+    """
+    return (
+        search_type,
+        ' '.join(term.lower().split()),
+        taxid,
+        selected_rank,
+        bool(metadata_only),
+        max_results
+    )
@@ -0,0 +1,88 @@
+import hashlib
+import json
+import os
+import time
+import config
+
+class SearchCheckpoint:
+    """
+    Append-only JSON lines file recording the progress of one NCBI search: the
+    History server state first, then one line per completed stage (ESummary
+    prefilter, EFetch window), so that an interrupted search can resume from
+    the last finished batch
+    """
+    def __init__(self, *search_key):
+        digest = hashlib.sha1(json.dumps(search_key).encode()).hexdigest()
+        self.path = os.path.join(config.SEARCH_CHECKPOINT_DIR, f"{digest}.jsonl")
+        self.state = None
+        self.entries = {}
+
+    def load(self):
+        """
+        Read a previous run of the same search, if any and not expired
+        Returns the saved History server state, or None
+        """
+        if not os.path.exists(self.path):
+            return None
+        if time.time() - os.path.getmtime(self.path) > config.SEARCH_CHECKPOINT_TTL:
+            self.discard()
+            return None
+
+        with open(self.path, encoding='utf-8') as checkpoint_file:
+            for line in checkpoint_file:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    # Last line cut short by the interruption
+                    break
+                if entry['kind'] == 'state':
+                    self.state = entry
+                else:
+                    self.entries[entry['kind']] = entry['records']
+
+        if self.state:
+            print(f"Resuming search from checkpoint ({len(self.entries)} completed batches)")
+        return self.state
+
+    def save_state(self, count, webenv, query_key):
+        """
+        Start the checkpoint file with the History server state, keeping the
+        batches already completed
+        """
+        os.makedirs(config.SEARCH_CHECKPOINT_DIR, exist_ok=True)
+        purge_stale_checkpoints()
+        self.state = {'kind': 'state', 'count': count, 'webenv': webenv, 'query_key': query_key, 'time': time.time()}
+        with open(self.path, 'w', encoding='utf-8') as checkpoint_file:
+            checkpoint_file.write(json.dumps(self.state) + '\n')
+            for kind, records in self.entries.items():
+                checkpoint_file.write(json.dumps({'kind': kind, 'records': records}) + '\n')
+
+    def get(self, kind):
+        return self.entries.get(kind)
+
+    def save(self, kind, records):
+        self.entries[kind] = records
+        with open(self.path, 'a', encoding='utf-8') as checkpoint_file:
+            checkpoint_file.write(json.dumps({'kind': kind, 'records': records}) + '\n')
+
+    def reset(self):
+        self.state = None
+        self.entries = {}
+
+    def discard(self):
+        self.reset()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+def purge_stale_checkpoints():
+    """
+    Remove the checkpoints of searches that were never resumed
+    """
+    now = time.time()
+    for filename in os.listdir(config.SEARCH_CHECKPOINT_DIR):
+        path = os.path.join(config.SEARCH_CHECKPOINT_DIR, filename)
+        try:
+            if now - os.path.getmtime(path) > config.SEARCH_CHECKPOINT_TTL:
+                os.remove(path)
+        except OSError:
+            pass
@@ -0,0 +1,120 @@
+import asyncio
+import math
+from nicegui import ui
+import config
+import styles
+from uniprot import count_uniprot_data
+from ncbi import count_ncbi_proteins, count_ncbi_genes
+
+# =============================================================================
+# COST ESTIMATES
+# =============================================================================
+
+def plan_uniprot(hits):
+    requests = max(1, math.ceil(hits / config.UNIPROT_PAGE_SIZE))
+    return plan_source('UniProtKB', hits, requests, hits * config.UNIPROT_ENTRY_BYTES, config.UNIPROT_REQUESTS_PER_SECOND)
+
+def plan_ncbi(hits, record_bytes, metadata_only=False, summaries=False):
+    """
+    Requests of search_ncbi_by_name: ESearch, then the ESummary windows when
+    summaries are checked, then the EFetch windows unless metadata only
+    """
+    requests = 1
+    size = 0
+    if summaries or metadata_only:
+        requests += math.ceil(hits / config.NCBI_ESUMMARY_WINDOW_SIZE)
+        size += hits * config.NCBI_SUMMARY_BYTES
+    if not metadata_only:
+        requests += math.ceil(hits / config.NCBI_EFETCH_WINDOW_SIZE)
+        size += hits * record_bytes
+    return plan_source('NCBI', hits, requests, size, config.NCBI_REQUESTS_PER_SECOND)
+
+def plan_source(database, hits, requests, size, requests_per_second):
+    """
+    Estimated cost of retrieving `hits` entries of one source, the duration
+    bounded by the rate limit or by the bandwidth, whichever is slower
+    """
+    return {
+        'database': database,
+        'hits': hits,
+        'requests': requests,
+        'bytes': size,
+        'seconds': max(requests / requests_per_second, size / config.SEARCH_PLAN_BANDWIDTH)
+    }
+
+async def plan_protein_search(protein_name, taxid=None, metadata_only=False):
+    """
+    Count the hits of a protein search in each source, without fetching them
+    """
+    uniprot_hits, ncbi_hits = await asyncio.gather(
+        count_uniprot_data(protein_name, taxid),
+        count_ncbi_proteins(protein_name, taxid)
+    )
+    return [
+        plan_uniprot(uniprot_hits or 0),
+        plan_ncbi(
+            ncbi_hits or 0, config.NCBI_PROTEIN_RECORD_BYTES, metadata_only,
+            config.NCBI_ESUMMARY_PREFILTER or config.SKIP_UNIPROT_COVERED_NCBI
+        )
+    ]
+
+async def plan_gene_search(gene_name, taxid=None, metadata_only=False):
+    """
+    Count the hits of a gene search, without fetching them
+    """
+    ncbi_hits = await count_ncbi_genes(gene_name, taxid)
+    return [plan_ncbi(ncbi_hits or 0, config.NCBI_MRNA_RECORD_BYTES, metadata_only, config.NCBI_ESUMMARY_PREFILTER)]
+
+def needs_confirmation(plan):
+    return (
+        any(source['hits'] > config.SEARCH_PLAN_CONFIRM_HITS for source in plan)
+        or sum(source['seconds'] for source in plan) > config.SEARCH_PLAN_CONFIRM_SECONDS
+    )
+
+def format_duration(seconds):
+    if seconds < 60:
+        return f"{math.ceil(seconds)} s"
+    if seconds < 3600:
+        return f"{math.ceil(seconds / 60)} min"
+    return f"{seconds / 3600:.1f} h"
+
+def plan_markdown(plan):
+    rows = [
+        '| Source | Hits | Requests | Download | Duration |',
+        '|---|---|---|---|---|'
+    ]
+    for source in plan:
+        rows.append(
+            f"| {source['database']} | {source['hits']:,} | {source['requests']:,} | "
+            f"{source['bytes'] / (1024 * 1024):,.1f} MB | {format_duration(source['seconds'])} |"
+        )
+    return '\n'.join(rows)
+
+# =============================================================================
+# CONFIRMATION DIALOG
+# =============================================================================
+
+async def confirm_search_plan(plan):
+    """
+    Show the estimated cost of a large search and wait for the user
+    Returns (confirmed, max_results): max_results is None to retrieve
+    everything, or the number of results to keep per source
+    """
+    with ui.dialog().props('persistent') as dialog, ui.card().classes('w-[36rem]'):
+        ui.label('Large search').classes(f'text-xl font-bold text-[{config.VIOLET_COLOR}]')
+        ui.markdown(plan_markdown(plan))
+        ui.markdown(
+            f"Estimated total: **{format_duration(sum(source['seconds'] for source in plan))}**, "
+            'during which the shared NCBI and UniProt quotas are used by this search. '
+            'Narrow the query (name, taxonomy) or cap the results retrieved from each source.'
+        )
+        cap_input = ui.number('Max results per source', value=config.SEARCH_PLAN_DEFAULT_CAP, min=1, precision=0)
+        with ui.row().classes('mt-4 w-full gap-4'):
+            cap_button = ui.button('Search capped', on_click=lambda: dialog.submit((True, int(cap_input.value or 1)))).classes('flex-1')
+            styles.apply_violet_color(cap_button)
+            ui.button('Search all', on_click=lambda: dialog.submit((True, None))).classes('flex-1')
+            ui.button('Cancel', on_click=lambda: dialog.submit((False, None))).classes('flex-1')
+
+    result = await dialog
+    dialog.clear()
+    return result or (False, None)
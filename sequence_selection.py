@@ -1,12 +1,15 @@
 
 from nicegui import ui
-import asyncio
 import config
 import styles
-from length_distribution import create_length_distribution_chart, get_sequence_length
+from length_distribution import create_length_distribution_chart
 from pipeline import create_fasta, run_full_pipeline
 from pipeline_results import show_pipeline1_results
-from ncbi import mrna_from_mrna_accession
+from ncbi import mrna_from_mrna_accession, fetch_missing_sequences
+from uniprot import fetch_nucleotide_references
+from protein_gene_table import refresh_table_rows
+from result_store import ResultStore
+from sequence_store import get_sequence_store
 from Bio import SeqIO
 from io import StringIO
 
@@ -160,17 +163,32 @@ def restore_database_data():
 # FILTER MANAGEMENT
 # =============================================================================
 
-def apply_filter(uniprot_only, ncbi_only, having_mrna, min_length, max_length):
+async def apply_filter(uniprot_only, ncbi_only, having_mrna, min_length, max_length):
     user_min, user_max = parse_length_filters(min_length, max_length)
     
-    selected_data = filter_by_database(uniprot_only, ncbi_only, having_mrna)
+    if having_mrna and config.current_search_type == 'protein':
+        # mRNA references of metadata-only NCBI proteins come with their full record,
+        # those of lean UniProtKB entries with their cross-references
+        config.loading_spinner.set_visibility(True)
+        try:
+            ncbi_proteins = config.all_proteins.select('NCBI')
+            if any(record.sequence_ref is None for record in ncbi_proteins):
+                await fetch_missing_sequences(ncbi_proteins, 'protein')
+                refresh_table_rows('ncbi', ncbi_proteins)
+            failures = []
+            if await fetch_nucleotide_references(config.all_proteins.select('UniProtKB'), failures):
+                refresh_table_rows('uniprot', config.all_proteins.select('UniProtKB'))
+            if failures:
+                ui.notify('Some UniProtKB mRNA references could not be retrieved, try again later.', color='warning')
+        finally:
+            config.loading_spinner.set_visibility(False)
     
-    if min_length or max_length:
-        selected_data = filter_by_length(selected_data, user_min, user_max)
-        if not selected_data:
-            data_type = "genes" if config.current_search_type == 'gene' else "proteins"
-            ui.notify(f'No {data_type} match your filter criteria', color='orange')
-            return
+    selected_data = filter_results(uniprot_only, ncbi_only, having_mrna, user_min, user_max)
+    
+    if (min_length or max_length) and not selected_data:
+        data_type = "genes" if config.current_search_type == 'gene' else "proteins"
+        ui.notify(f'No {data_type} match your filter criteria', color='orange')
+        return
     
     update_selected_data(selected_data)
     
@@ -201,52 +219,30 @@ def parse_length_filters(min_length, max_length):
     
     return user_min, user_max
 
-def filter_by_database(uniprot_only, ncbi_only, having_mrna):
+def filter_results(uniprot_only, ncbi_only, having_mrna, min_len=None, max_len=None):
+    """
+    Select the matching results on the store columns, as indices into the
+    search results rather than a copy of them
+    """
     if config.current_search_type == 'gene':
-        return config.ncbi_genes.copy()
+        return config.ncbi_genes.select(min_length=min_len or None, max_length=max_len or None)
     
     if uniprot_only:
         config.selection_params['uniprot'] = True
         config.selection_params['ncbi'] = False
-        selected_data = config.uniprot_proteins.copy()
+        database = 'UniProtKB'
     elif ncbi_only:
         config.selection_params['uniprot'] = False
         config.selection_params['ncbi'] = True
-        selected_data = config.ncbi_proteins.copy()
+        database = 'NCBI'
     else:
         config.selection_params['uniprot'] = True
         config.selection_params['ncbi'] = True
-        selected_data = config.all_proteins.copy()
+        database = None
 
-    if having_mrna:
-        config.use_mrna_from_proteins_button.set_visibility(True)
-        selected_data = [item for item in selected_data if item.get('mRNA', False)]
-    else:
-        config.use_mrna_from_proteins_button.set_visibility(False)
+    config.use_mrna_from_proteins_button.set_visibility(bool(having_mrna))
     
-    return selected_data
-
-def filter_by_length(selected_data, min_len, max_len):
-    try:
-        length_filtered = []
-        for item in selected_data:
-            seq_length = get_sequence_length(item)
-            if isinstance(seq_length, str):
-                try:
-                    seq_length = int(seq_length)
-                except ValueError:
-                    continue
-            
-            if min_len != '*' and min_len and seq_length < min_len:
-                continue
-            if max_len != '*' and max_len and seq_length > max_len:
-                continue
-            length_filtered.append(item)
-        
-        return length_filtered
-    except ValueError:
-        ui.notify('Please enter valid numbers for length filters', color='orange')
-        return []
+    return config.all_proteins.select(database, having_mrna, min_len or None, max_len or None)
 
 def update_selected_data(selected_data):
     config.selected_data = selected_data
@@ -264,12 +260,17 @@ def update_length_chart(selected_data, user_min, user_max):
 
 async def show_mrna_sequence_selection():
     try:
+        failures = []
+        await fetch_nucleotide_references(config.selected_data, failures)
+        if failures:
+            ui.notify('Some UniProtKB mRNA references could not be retrieved, try again later.', color='warning')
+        
         mrna_accessions = []
-        for entry in config.selected_data:
-            if entry.get('mRNA') is None:
-                print(f"No mRNA found for entry: {entry.get('primaryAccession', 'Unknown')}")
+        for record in config.selected_data:
+            if record.mRNA is None:
+                print(f"No mRNA found for entry: {record.accession}")
             else:
-                mrna_accessions.append(entry['mRNA'].split('.')[0])
+                mrna_accessions.append(record.mRNA)
         
         if not mrna_accessions:
             ui.notify('No mRNA accessions found in selected proteins', color='warning')
@@ -278,16 +279,18 @@ async def show_mrna_sequence_selection():
         config.loading_spinner.set_visibility(True)
         ui.notify(f'Retrieving {len(mrna_accessions)} mRNA sequences from NCBI...', color='info')
         
-        loop = asyncio.get_event_loop()
-        selected_genes = await loop.run_in_executor(None, mrna_from_mrna_accession, mrna_accessions)
+        failures = []
+        selected_genes = await mrna_from_mrna_accession(mrna_accessions, failures)
+        if failures:
+            ui.notify('Some mRNA sequences could not be retrieved from NCBI, try again later.', color='warning')
         
         print(f"Retrieved {len(selected_genes)} mRNA sequences from {len(mrna_accessions)} selected proteins")
         
         if selected_genes:
             # Switch to gene mode and update config
             config.current_search_type = 'gene'
-            config.ncbi_genes = selected_genes
-            config.selected_data = selected_genes
+            config.ncbi_genes = ResultStore(selected_genes)
+            config.selected_data = config.ncbi_genes
             
             # Update search params for gene mode
             config.selection_params['uniprot'] = False
@@ -330,12 +333,12 @@ def read_loaded_fasta(content):
             accession_parts = accession.split('_')
             scientific_name = ' '.join(accession_parts[:-1]) if len(accession_parts) > 1 else 'Unknown'
             
+            # Sequences stay in the uploaded content, kept in the sequence store
             entry = {
                 'accession': accession,
                 'scientific_name': scientific_name,
                 'name': name,
-                'length': len(record.seq),
-                'sequence': str(record.seq)
+                'length': len(record.seq)
             }
             fasta_entries.append(entry)
         except Exception as e:
@@ -355,7 +358,7 @@ async def handle_custom_fasta_upload(e):
             return
         
         # Store custom FASTA for upload to server
-        config.custom_fasta_content = content
+        config.custom_fasta_content = get_sequence_store().put(content_bytes)
         config.custom_fasta_filename = filename
         
         # Store parsed data in selected_data
@@ -401,16 +404,8 @@ def update_database_buttons():
 def get_species_list():
     species_list = set()
     
-    if config.current_search_type == 'gene':
-        for gene in config.selected_data:
-            scientific_name = gene.get('scientific_name', 'Unknown')
-            taxid = gene.get('taxid', 'Unknown')
-            species_list.add((scientific_name, taxid))
-    else:
-        for protein in config.selected_data:
-            scientific_name = protein.get('organism', {}).get('scientificName', protein.get('scientific_name', 'Unknown'))
-            taxid = protein.get('organism', {}).get('taxonId', protein.get('taxid', 'Unknown'))
-            species_list.add((scientific_name, taxid))
+    for record in config.selected_data:
+        species_list.add((record.scientific_name or 'Unknown', record.taxid or 'Unknown'))
     
     return species_list
 
@@ -0,0 +1,161 @@
+import mmap
+import os
+import tempfile
+import threading
+import config
+
+class SequenceStore:
+    """
+    Append-only store of the sequences of the process, shared by the cached
+    searches and the sessions. Sequences are kept in memory until they exceed
+    `memory_budget` bytes, then spilled to a file read back through mmap.
+    Records only keep an (offset, length, generation) reference, see compact
+    for dropping the sequences no longer referenced
+    """
+    def __init__(self, directory, memory_budget):
+        self.directory = directory
+        self.memory_budget = memory_budget
+        self.lock = threading.Lock()
+        self.generation = 0  # Incremented by compact, older references are rejected
+        self.stale = []  # (map, path) of the files replaced by compact, not removed yet
+
+        os.makedirs(directory, exist_ok=True)
+        self.open_file()
+
+    def open_file(self):
+        descriptor, self.path = tempfile.mkstemp(suffix='.seq', dir=self.directory)
+        self.file = os.fdopen(descriptor, 'r+b')
+        self.map = None
+        self.spilled = 0  # Bytes written to the file
+        self.size = 0  # Bytes stored, on disk and in memory
+        self.pending = {}  # offset -> bytes, not spilled yet
+        self.pending_bytes = 0
+
+    def put(self, sequence):
+        """
+        Store a sequence (str or bytes) and return its reference
+        """
+        data = sequence.encode() if isinstance(sequence, str) else bytes(sequence)
+        if not data:
+            # Not stored, its offset would be the one of the next sequence
+            return EMPTY_REFERENCE
+        with self.lock:
+            reference = (self.size, len(data), self.generation)
+            self.pending[self.size] = data
+            self.size += len(data)
+            self.pending_bytes += len(data)
+            if self.pending_bytes > self.memory_budget:
+                self.spill()
+        return reference
+
+    def spill(self):
+        self.file.seek(self.spilled)
+        for offset in sorted(self.pending):
+            self.file.write(self.pending[offset])
+        self.file.flush()
+        self.spilled = self.size
+        self.pending = {}
+        self.pending_bytes = 0
+        # Views on the previous map stay valid, it is released with the last of them
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def view(self, reference):
+        """
+        Zero-copy memoryview of the bytes of a stored sequence
+        """
+        offset, length, generation = reference
+        if not length:
+            return memoryview(b'')
+        with self.lock:
+            if generation != self.generation:
+                raise ValueError("Stale sequence reference, the store was compacted since it was taken")
+            if offset >= self.spilled:
+                return memoryview(self.pending[offset])[:length]
+            return memoryview(self.map)[offset:offset + length]
+
+    def get(self, reference):
+        return str(self.view(reference), 'utf-8')
+
+    def compact(self, references):
+        """
+        Rewrite the store with only the sequences of `references`, dropping
+        the others, the file is emptied when none is left
+        Returns {old reference: new reference}. Views taken before stay valid,
+        but any other reference of the previous generation now raises on read
+        """
+        with self.lock:
+            live = sorted({
+                (offset, length) for offset, length, generation in references
+                if length and generation == self.generation
+            })
+            old_map, old_pending, old_spilled = self.map, self.pending, self.spilled
+            old_file, old_path, old_generation = self.file, self.path, self.generation
+            self.open_file()
+            self.generation += 1
+
+            moved = {}
+            for offset, length in live:
+                if offset >= old_spilled:
+                    data = old_pending[offset]
+                else:
+                    data = old_map[offset:offset + length]
+                moved[(offset, length, old_generation)] = (self.size, length, self.generation)
+                self.file.write(data)
+                self.size += length
+            self.file.flush()
+            self.spilled = self.size
+            if self.size:
+                self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+
+            old_file.close()
+            self.stale.append((old_map, old_path))
+            self.remove_stale()
+        return moved
+
+    def remove_stale(self):
+        """
+        Remove the replaced files whose map is no longer viewed, the others
+        are retried at the next compaction or at exit (an open map or view
+        prevents the removal on Windows)
+        """
+        stale = []
+        for old_map, path in self.stale:
+            try:
+                if old_map is not None:
+                    old_map.close()
+                    old_map = None
+                os.remove(path)
+            except BufferError:
+                stale.append((old_map, path))
+            except OSError as e:
+                if os.path.exists(path):
+                    print(f"Could not remove {path}: {e}")
+                    stale.append((old_map, path))
+        self.stale = stale
+
+    def close(self):
+        with self.lock:
+            self.pending = {}
+            self.file.close()
+            self.stale.append((self.map, self.path))
+            self.map = None
+            self.remove_stale()
+
+EMPTY_REFERENCE = (0, 0, 0)
+
+sequence_store = None
+
+def get_sequence_store():
+    """
+    Return the sequence store of the process
+    """
+    global sequence_store
+    if sequence_store is None:
+        sequence_store = SequenceStore(config.SEQUENCE_STORE_DIR, config.SEQUENCE_STORE_MEMORY_BUDGET)
+    return sequence_store
+
+def close_sequence_store():
+    global sequence_store
+    if sequence_store is not None:
+        sequence_store.close()
+        sequence_store = None
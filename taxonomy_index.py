@@ -0,0 +1,227 @@
+import json
+import os
+import sys
+import threading
+import zlib
+from array import array
+import config
+
+SNAPSHOT_VERSION = 1
+
+class TaxonomyIndex:
+    """
+    NCBI taxonomy held in arrays indexed by taxid: parent, rank code and
+    scientific name (offsets into one UTF-8 blob), plus an open addressing
+    hash table of the lowercased scientific names. Name lookups are O(1) and
+    ancestor lookups O(depth), without network access
+    """
+    def __init__(self, ranks, parents, rank_codes, name_offsets, names, name_table):
+        self.ranks = ranks
+        self.parents = parents
+        self.rank_codes = rank_codes
+        self.name_offsets = name_offsets
+        self.names = names
+        self.name_table = name_table
+        self.mask = len(name_table) - 1
+
+    def __contains__(self, taxid):
+        return isinstance(taxid, int) and 0 < taxid < len(self.parents) and self.parents[taxid] != 0
+
+    def scientific_name(self, taxid):
+        return self.names[self.name_offsets[taxid]:self.name_offsets[taxid + 1]].decode('utf-8')
+
+    def rank(self, taxid):
+        return self.ranks[self.rank_codes[taxid]]
+
+    def taxid_by_name(self, name):
+        key = name.lower()
+        slot = zlib.crc32(key.encode('utf-8')) & self.mask
+        while True:
+            taxid = self.name_table[slot]
+            if taxid == 0:
+                return None
+            if self.scientific_name(taxid).lower() == key:
+                return taxid
+            slot = (slot + 1) & self.mask
+
+    def lookup(self, taxonomy_name):
+        """
+        Same result as fetch_taxonomy, from a taxid or a scientific name
+        """
+        taxonomy_name = taxonomy_name.strip()
+        taxid = int(taxonomy_name) if taxonomy_name.isdigit() else self.taxid_by_name(taxonomy_name)
+        if taxid not in self:
+            return None
+        return {
+            "scientific_name": self.scientific_name(taxid),
+            "taxid": taxid,
+            "rank": self.rank(taxid)
+        }
+
+    def ancestor_at_rank(self, taxid, selected_rank):
+        """
+        (taxid, scientific name) of the taxon itself or of its closest
+        ancestor at the selected rank, (None, None) if there is none
+        """
+        if selected_rank not in self.ranks:
+            return None, None
+        code = self.ranks.index(selected_rank)
+        while True:
+            if self.rank_codes[taxid] == code:
+                return taxid, self.scientific_name(taxid)
+            parent = self.parents[taxid]
+            if parent == taxid:
+                return None, None
+            taxid = parent
+
+    # =========================================================================
+    # BUILD AND SNAPSHOT
+    # =========================================================================
+
+    @classmethod
+    def from_taxdump(cls, directory):
+        """
+        Build the index from nodes.dmp and names.dmp of an NCBI taxdump
+        """
+        ranks = []
+        rank_index = {}
+        parents = array('i')
+        rank_codes = array('B')
+        with open(os.path.join(directory, 'nodes.dmp'), encoding='utf-8') as nodes_file:
+            for line in nodes_file:
+                fields = line.split('\t|\t', 3)
+                taxid, parent, rank = int(fields[0]), int(fields[1]), fields[2]
+                if taxid >= len(parents):
+                    grow = taxid + 1 - len(parents)
+                    parents.extend(array('i', bytes(grow * parents.itemsize)))
+                    rank_codes.extend(bytes(grow))
+                if rank not in rank_index:
+                    rank_index[rank] = len(ranks)
+                    ranks.append(rank)
+                parents[taxid] = parent
+                rank_codes[taxid] = rank_index[rank]
+
+        scientific_names = {}
+        with open(os.path.join(directory, 'names.dmp'), encoding='utf-8') as names_file:
+            for line in names_file:
+                if not line.endswith('scientific name\t|\n'):
+                    continue
+                fields = line.split('\t|\t', 2)
+                scientific_names[int(fields[0])] = fields[1]
+
+        name_offsets = array('I', [0])
+        names = bytearray()
+        for taxid in range(len(parents)):
+            name = scientific_names.get(taxid)
+            if name and parents[taxid]:
+                names += name.encode('utf-8')
+            name_offsets.append(len(names))
+
+        # Table at most half full, so that probe sequences stay short
+        size = 1
+        while size < 2 * len(scientific_names):
+            size *= 2
+        name_table = array('i', bytes(size * array('i').itemsize))
+        mask = size - 1
+        for taxid in range(len(parents)):
+            if name_offsets[taxid + 1] == name_offsets[taxid]:
+                continue
+            key = names[name_offsets[taxid]:name_offsets[taxid + 1]].decode('utf-8').lower()
+            slot = zlib.crc32(key.encode('utf-8')) & mask
+            while name_table[slot] != 0:
+                # Homonyms keep the lowest taxid
+                if names[name_offsets[name_table[slot]]:name_offsets[name_table[slot] + 1]].decode('utf-8').lower() == key:
+                    break
+                slot = (slot + 1) & mask
+            else:
+                name_table[slot] = taxid
+
+        return cls(tuple(ranks), parents, rank_codes, name_offsets, bytes(names), name_table)
+
+    def save(self, path):
+        """
+        Write a binary snapshot: one JSON header line, then the raw arrays
+        """
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        header = {
+            'version': SNAPSHOT_VERSION,
+            'byteorder': sys.byteorder,
+            'ranks': self.ranks,
+            'columns': [
+                [name, getattr(self, name).typecode, getattr(self, name).itemsize, len(getattr(self, name))]
+                for name in ('parents', 'rank_codes', 'name_offsets', 'name_table')
+            ],
+            'names': len(self.names)
+        }
+        temporary_path = f"{path}.tmp"
+        with open(temporary_path, 'wb') as snapshot_file:
+            snapshot_file.write(json.dumps(header).encode() + b'\n')
+            for name, _, _, _ in header['columns']:
+                getattr(self, name).tofile(snapshot_file)
+            snapshot_file.write(self.names)
+        os.replace(temporary_path, path)
+
+    @classmethod
+    def load(cls, path):
+        """
+        Read a snapshot written by save, or return None if it does not fit
+        this version or platform
+        """
+        with open(path, 'rb') as snapshot_file:
+            header = json.loads(snapshot_file.readline())
+            if header.get('version') != SNAPSHOT_VERSION or header.get('byteorder') != sys.byteorder:
+                return None
+            columns = {}
+            for name, typecode, itemsize, length in header['columns']:
+                column = array(typecode)
+                if column.itemsize != itemsize:
+                    return None
+                column.fromfile(snapshot_file, length)
+                columns[name] = column
+            names = snapshot_file.read(header['names'])
+        return cls(tuple(header['ranks']), columns['parents'], columns['rank_codes'], columns['name_offsets'],
+                   names, columns['name_table'])
+
+# =============================================================================
+# SHARED INDEX
+# =============================================================================
+
+taxonomy_index = None
+taxonomy_index_loaded = False
+taxonomy_index_lock = threading.Lock()
+
+def taxdump_mtime():
+    paths = [os.path.join(config.TAXDUMP_DIR, name) for name in ('nodes.dmp', 'names.dmp')]
+    if not all(os.path.exists(path) for path in paths):
+        return None
+    return max(os.path.getmtime(path) for path in paths)
+
+def get_taxonomy_index():
+    """
+    The local taxonomy, loaded once from the snapshot or built from the
+    taxdump (and snapshotted) when the snapshot is missing or older
+    Returns None when neither is present, callers then use the network
+    """
+    global taxonomy_index, taxonomy_index_loaded
+    if taxonomy_index_loaded or not config.TAXONOMY_INDEX_ENABLED:
+        return taxonomy_index
+
+    with taxonomy_index_lock:
+        if taxonomy_index_loaded:
+            return taxonomy_index
+        try:
+            dump_mtime = taxdump_mtime()
+            snapshot = config.TAXONOMY_SNAPSHOT_PATH
+            if os.path.exists(snapshot) and (dump_mtime is None or os.path.getmtime(snapshot) >= dump_mtime):
+                taxonomy_index = TaxonomyIndex.load(snapshot)
+            if taxonomy_index is None and dump_mtime is not None:
+                print("Building taxonomy index from taxdump...")
+                taxonomy_index = TaxonomyIndex.from_taxdump(config.TAXDUMP_DIR)
+                taxonomy_index.save(snapshot)
+            if taxonomy_index is not None:
+                print(f"Taxonomy index loaded ({len(taxonomy_index.name_offsets) - 1} taxids)")
+        except (OSError, ValueError) as e:
+            print(f"Taxonomy index unavailable: {e}")
+            taxonomy_index = None
+        taxonomy_index_loaded = True
+    return taxonomy_index
@@ -1,9 +1,30 @@
-import requests
+import asyncio
+import codecs
+import json
+import math
+import re
 import httpx
 from datetime import datetime
+import config
+from http_clients import get_async_client, get_sync_client
+from rate_limit import uniprot_governor, governed_request, governed_request_sync, governed_stream
+from result_store import SearchRecord
+from taxonomy_index import get_taxonomy_index
+from lineage_cache import get_lineage_cache
+
+# Columns of the result tables and filters; the cross-references give the
+# mRNA and the NCBI proteins covered by each entry
+UNIPROT_LEAN_FIELDS = "accession,id,protein_name,organism_name,organism_id,gene_names,length"
+UNIPROT_FIELDS = f"{UNIPROT_LEAN_FIELDS},xref_embl,xref_refseq"
 
 def fetch_taxonomy(taxonomy_name):
-    base_url = "https://rest.uniprot.org/taxonomy/search"
+    index = get_taxonomy_index()
+    if index is not None:
+        taxo = index.lookup(taxonomy_name)
+        if taxo:
+            return taxo
+    
+    base_url = f"{config.UNIPROT_REST_URL}/taxonomy/search"
     params = {
         "query": taxonomy_name,
         "format": "json",
@@ -28,9 +49,8 @@ def fetch_taxonomy(taxonomy_name):
     
     raise ValueError(f"Taxonomy name '{taxonomy_name}' not found.")
 
-def fetch_uniprot_data(protein_name, taxid=None, min_length=None, max_length=None):
+def build_uniprot_query(protein_name, taxid=None, min_length=None, max_length=None):
     protein_name = protein_name.replace(" ", "+")
-    base_url = "https://rest.uniprot.org/uniprotkb/stream"
     query_parts = [f"protein_name:{protein_name}"]
     
     if taxid is not None:
@@ -42,73 +62,581 @@ def fetch_uniprot_data(protein_name, taxid=None, min_length=None, max_length=Non
     elif max_length is not None:
         query_parts.append(f"length:[* TO {max_length}]")
     
-    query = " AND ".join(query_parts)
+    return " AND ".join(query_parts)
+
+async def count_uniprot_data(protein_name, taxid=None, min_length=None, max_length=None):
+    """
+    Number of UniProtKB entries a search would return, from the
+    x-total-results header of an empty page, or None if unknown
+    """
+    base_url = f"{config.UNIPROT_REST_URL}/uniprotkb/search"
     params = {
-        "query": query,
+        "query": build_uniprot_query(protein_name, taxid, min_length, max_length),
         "format": "json",
-        "fields": "accession,id,protein_name,organism_name,organism_id,gene_names,length,xref_embl,xref_refseq",
+        "size": 0
     }
+    try:
+        response = await governed_request(get_async_client('uniprot'), uniprot_governor, 'GET', base_url, params=params)
+        if response.status_code == 200 and 'x-total-results' in response.headers:
+            return int(response.headers['x-total-results'])
+        print(f"UniProt count failed with status code: {response.status_code}")
+    except httpx.HTTPError as e:
+        print(f"Request failed: {e}")
+    return None
+
+async def fetch_uniprot_data(protein_name, taxid=None, min_length=None, max_length=None, covered_accessions=None, max_results=None, failures=None):
+    """
+    Search UniProtKB by protein name, yielding the entries page by page
+    When a covered_accessions set is given, the RefSeq and EMBL protein
+    accessions cross-referenced by the entries are added to it
+    If max_results is None, retrieves ALL available results
+    With UNIPROT_LEAN_PROJECTION, EMBL cross-references are left out (RefSeq
+    ones are kept only to fill covered_accessions) and records without a
+    RefSeq mRNA are marked for fetch_nucleotide_references
+    Pages that could not be retrieved are reported in the failures list given
+    """
+    if not config.UNIPROT_LEAN_PROJECTION:
+        fields = UNIPROT_FIELDS
+    elif covered_accessions is not None:
+        fields = f"{UNIPROT_LEAN_FIELDS},xref_refseq"
+    else:
+        fields = UNIPROT_LEAN_FIELDS
     
-    results = requests_get(base_url, params)
-    if results:
-        # Restructure data to use sequence_length like NCBI
-        for protein in results:
-            # Add sequence_length field from the existing sequence structure
-            if 'sequence' in protein and 'length' in protein['sequence']:
-                protein['sequence_length'] = protein['sequence']['length']
-            elif 'length' in protein:
-                # If length is directly in protein (from API fields)
-                protein['sequence_length'] = protein['length']
-            else:
-                protein['sequence_length'] = 0
-        return results
-    return []
+    def convert(protein):
+        record, references = convert_entry(protein)
+        record.mrna_pending = config.UNIPROT_LEAN_PROJECTION and record.mRNA is None
+        return record, references
+    
+    base_url = f"{config.UNIPROT_REST_URL}/uniprotkb/search"
+    params = {
+        "query": build_uniprot_query(protein_name, taxid, min_length, max_length),
+        "format": "json",
+        "fields": fields,
+        "size": config.UNIPROT_PAGE_SIZE if max_results is None else min(config.UNIPROT_PAGE_SIZE, max_results)
+    }
+    
+    # Large searches are split into length slices fetched concurrently
+    slices = None
+    if config.UNIPROT_PARTITIONED_FETCH and (max_results is None or max_results > config.UNIPROT_PARTITION_MIN_RESULTS):
+        slices = await partition_uniprot_query(protein_name, taxid, min_length, max_length)
+    if slices:
+        print(f"Fetching UniProtKB in {len(slices)} slices")
+        pages = merge_pages(
+            [requests_get_pages(base_url, {**params, "query": query}, convert, failures) for query in slices],
+            failures
+        )
+    else:
+        pages = requests_get_pages(base_url, params, convert, failures)
+    
+    remaining = max_results
+    try:
+        async for results in pages:
+            if remaining is not None:
+                results = results[:remaining]
+                remaining -= len(results)
+            if covered_accessions is not None:
+                for _, references in results:
+                    covered_accessions.update(references)
+            yield [record for record, _ in results]
+            if remaining == 0:
+                return
+    finally:
+        await pages.aclose()
 
-def fetch_rank(taxid, selected_rank):
-    url = f"https://rest.uniprot.org/taxonomy/search?query=(tax_id:{taxid})&format=json"
+def convert_entry(protein):
+    """
+    Keep only what the search needs of a UniProtKB JSON entry: its record and
+    the accessions of the NCBI proteins it describes
+    """
+    return record_from_uniprot(protein), extract_protein_references(protein.get('uniProtKBCrossReferences', []))
+
+async def fetch_uniprot_accessions(accessions, fields, convert, failures=None):
+    """
+    Fetch the given `fields` of UniProtKB entries by accession, in concurrent
+    /uniprotkb/accessions batches paced by the shared rate limit, passing
+    each entry through `convert`
+    Returns the number of entries received, failed batches are reported in
+    the failures list given
+    """
+    url = f"{config.UNIPROT_REST_URL}/uniprotkb/accessions"
+    batch_size = config.UNIPROT_ACCESSIONS_BATCH_SIZE
+    pages = merge_pages([
+        requests_get_pages(url, {
+            "accessions": ",".join(accessions[i:i + batch_size]),
+            "fields": fields,
+            "format": "json",
+            "size": batch_size
+        }, convert, failures)
+        for i in range(0, len(accessions), batch_size)
+    ], failures)
+    received = 0
+    async for results in pages:
+        received += len(results)
+    return received
+
+async def fetch_nucleotide_references(records, failures=None):
+    """
+    Resolve in bulk the mRNA of the UniProtKB records fetched with the lean
+    projection, from their EMBL and RefSeq cross-references
+    Returns the number of records resolved, see fetch_uniprot_accessions for
+    failures
+    """
+    pending = {}
+    for record in records:
+        if record.database == 'UniProtKB' and record.mrna_pending:
+            pending.setdefault(record.accession, []).append(record)
+    if not pending:
+        return 0
+    
+    def resolve(protein):
+        mRNA = extract_nucleotide_reference(protein.get('uniProtKBCrossReferences', []))
+        for record in pending.get(protein.get('primaryAccession'), []):
+            record.mRNA = mRNA
+            record.mrna_pending = False
+        return protein.get('primaryAccession')
+    
+    resolved = await fetch_uniprot_accessions(list(pending), "accession,xref_embl,xref_refseq", resolve, failures)
+    print(f"Resolved the mRNA references of {resolved} UniProtKB entries")
+    return resolved
+
+async def fetch_uniprot_sequences(records, failures=None):
+    """
+    Fetch in bulk the sequences of the UniProtKB records, which the search
+    leaves out, when the FASTA of the selection is built
+    Returns the number of records resolved, see fetch_uniprot_accessions for
+    failures
+    """
+    pending = {}
+    for record in records:
+        if record.database == 'UniProtKB' and record.sequence_ref is None:
+            pending.setdefault(record.accession, []).append(record)
+    if not pending:
+        return 0
+    
+    def resolve(protein):
+        sequence = protein.get('sequence', {}).get('value')
+        for record in pending.get(protein.get('primaryAccession'), []):
+            record.sequence = sequence
+        return protein.get('primaryAccession')
+    
+    resolved = await fetch_uniprot_accessions(list(pending), "accession,sequence", resolve, failures)
+    print(f"Fetched the sequences of {resolved} UniProtKB entries")
+    return resolved
+
+def length_buckets(min_length=None, max_length=None):
+    """
+    (low, high) length ranges of UNIPROT_PARTITION_LENGTH_EDGES within the
+    searched lengths, high None for no upper bound
+    """
+    edges = config.UNIPROT_PARTITION_LENGTH_EDGES
+    buckets = []
+    for i, low in enumerate(edges):
+        high = edges[i + 1] - 1 if i + 1 < len(edges) else None
+        if min_length is not None:
+            if high is not None and high < min_length:
+                continue
+            low = max(low, min_length)
+        if max_length is not None:
+            if low > max_length:
+                break
+            high = max_length if high is None else min(high, max_length)
+        buckets.append((low, high))
+    return buckets
+
+async def partition_uniprot_query(protein_name, taxid=None, min_length=None, max_length=None):
+    """
+    Split a search into disjoint length ranges holding about the same number
+    of entries, sized from the counts of fixed length buckets
+    Returns the queries of the slices, or None when the search is small
+    enough to be fetched serially
+    """
+    total = await count_uniprot_data(protein_name, taxid, min_length, max_length)
+    if not total or total <= config.UNIPROT_PARTITION_MIN_RESULTS:
+        return None
+    
+    buckets = length_buckets(min_length, max_length)
+    if not buckets:
+        return None
+    counts = await asyncio.gather(*(count_uniprot_data(protein_name, taxid, low, high) for low, high in buckets))
+    if None in counts:
+        return None
+    
+    slice_count = min(config.UNIPROT_PARTITIONS, math.ceil(total / config.UNIPROT_PAGE_SIZE))
+    target = sum(counts) / slice_count
+    slices = []
+    low = None
+    size = 0
+    for (bucket_low, bucket_high), count in zip(buckets, counts):
+        if low is None:
+            low = bucket_low
+        size += count
+        if size >= target and len(slices) < slice_count - 1:
+            slices.append((low, bucket_high))
+            low = None
+            size = 0
+    if low is not None:
+        slices.append((low, buckets[-1][1]))
+    
+    return [build_uniprot_query(protein_name, taxid, low, high) for low, high in slices]
+
+def record_from_uniprot(protein):
+    """
+    SearchRecord from a UniProtKB JSON entry, in the schema shared with NCBI
+    """
+    entry_type = protein.get('entryType', '')
+    if 'unreviewed' in entry_type.lower():
+        entry_type = 'TrEMBL'
+    elif 'reviewed' in entry_type.lower():
+        entry_type = 'SwissProt'
+    
+    organism = protein.get('organism', {})
+    
     try:
-        response = requests.get(url)
-        if response.status_code == 200:
-            data = response.json()['results'][0]
-            lineage = data.get('lineage', [])
-            if data.get('rank') == selected_rank:
-                return (data['taxonId'], data['scientificName'])
-            for i in range(len(lineage)-1, -1, -1):
-                if lineage[i]['rank'] == selected_rank:
-                    return (lineage[i]['taxonId'], lineage[i]['scientificName'])
-        return None, None
-    except requests.exceptions.RequestException as e:
-        print(f"Request failed: {e}")
+        if 'recommendedName' in protein['proteinDescription']:
+            protein_name = protein['proteinDescription']['recommendedName']['fullName']['value']
+        elif 'submissionNames' in protein['proteinDescription']:
+            protein_name = protein['proteinDescription']['submissionNames'][0]['fullName']['value']
+        else:
+            protein_name = None
+    except (KeyError, TypeError, IndexError):
+        protein_name = None
+    
+    try:
+        gene_name = protein['genes'][0]['geneName']['value']
+    except (KeyError, TypeError, IndexError):
+        gene_name = None
+    
+    # Length from the sequence structure, or from the `length` field when requested alone
+    if 'sequence' in protein and 'length' in protein['sequence']:
+        sequence_length = protein['sequence']['length']
+    else:
+        sequence_length = protein.get('length', 0)
+    
+    return SearchRecord(
+        'UniProtKB',
+        protein.get('primaryAccession'),
+        taxid=organism.get('taxonId'),
+        scientific_name=organism.get('scientificName'),
+        protein_name=protein_name,
+        gene_name=gene_name,
+        sequence_length=sequence_length,
+        mRNA=extract_nucleotide_reference(protein.get('uniProtKBCrossReferences', [])),
+        sequence=protein.get('sequence', {}).get('value'),
+        entry_type=entry_type or None,
+        entry_name=protein.get('uniProtkbId')
+    )
+
+def extract_nucleotide_reference(cross_references):
+    if not cross_references:
+        return None
+    
+    refseq_ref = None
+    mrna_ref = None
+    
+    for ref in cross_references:
+        database = ref.get('database', '')
+        ref_id = ref.get('id', '')
+        
+        if database == 'RefSeq':
+            properties = ref.get('properties', [])
+            for prop in properties:
+                if prop.get('key') == 'NucleotideSequenceId':
+                    refseq_ref = prop.get('value')
+            
+        elif database == 'EMBL':
+            properties = ref.get('properties', [])
+            for prop in properties:
+                if prop.get('key') == 'MoleculeType' and prop.get('value') == 'mRNA':
+                    mrna_ref = ref_id
+                    break
+    
+    return refseq_ref or mrna_ref
+
+def extract_protein_references(cross_references):
+    """
+    Unversioned accessions of the NCBI proteins (RefSeq, EMBL/GenBank
+    translations) that describe the same protein as a UniProtKB entry
+    """
+    accessions = []
+    for ref in cross_references or []:
+        database = ref.get('database', '')
+        if database == 'RefSeq':
+            accessions.append(ref.get('id', '').split('.')[0])
+        elif database == 'EMBL':
+            for prop in ref.get('properties', []):
+                if prop.get('key') == 'ProteinId' and prop.get('value', '-') != '-':
+                    accessions.append(prop['value'].split('.')[0])
+    return accessions
+
+def rank_from_taxonomy(data, selected_rank):
+    """
+    (taxid, scientific name) at the selected rank from a UniProt taxonomy
+    entry: the taxon itself or the closest ancestor of its lineage
+    """
+    lineage = data.get('lineage', [])
+    if data.get('rank') == selected_rank:
+        return (data['taxonId'], data['scientificName'])
+    for i in range(len(lineage)-1, -1, -1):
+        if lineage[i]['rank'] == selected_rank:
+            return (lineage[i]['taxonId'], lineage[i]['scientificName'])
     return None, None
 
+async def fetch_ranks(taxids, selected_rank):
+    """
+    {taxid: (taxid, scientific name) at the selected rank} for a set of taxids
+    Taxids missing from the local taxonomy and from the lineage cache are
+    resolved with OR-combined tax_id queries, a bounded number of them at
+    once, then one by one for those missing from the results (merged or
+    renamed taxids), and added to the lineage cache
+    Unresolved taxids map to (None, None)
+    """
+    loop = asyncio.get_event_loop()
+    index = await loop.run_in_executor(None, get_taxonomy_index)
+    lineages = await loop.run_in_executor(None, get_lineage_cache)
+    
+    ranks = {}
+    remaining = []
+    for taxid in taxids:
+        if index is not None and taxid in index:
+            ranks[taxid] = index.ancestor_at_rank(taxid, selected_rank)
+        elif isinstance(taxid, int):
+            remaining.append(taxid)
+        else:
+            ranks[taxid] = (None, None)
+    
+    if lineages is not None and remaining:
+        ranks.update(lineages.get_many(remaining, selected_rank))
+        remaining = [taxid for taxid in remaining if taxid not in ranks]
+    
+    client = get_async_client('uniprot')
+    semaphore = asyncio.Semaphore(config.UNIPROT_MAX_CONCURRENT_REQUESTS)
+    url = f"{config.UNIPROT_REST_URL}/taxonomy/search"
+    
+    async def search_taxonomy(batch):
+        """
+        Taxonomy entries of an OR-combined tax_id query, None if it failed
+        """
+        params = {
+            "query": " OR ".join(f"tax_id:{taxid}" for taxid in batch),
+            "format": "json",
+            "size": len(batch)
+        }
+        try:
+            async with semaphore:
+                response = await governed_request(client, uniprot_governor, 'GET', url, params=params)
+            if response.status_code == 200:
+                return response.json().get('results', [])
+            print(f"UniProt taxonomy request failed with status code: {response.status_code}")
+        except httpx.HTTPError as e:
+            print(f"Request failed: {e}")
+        return None
+    
+    async def fetch_batch(batch):
+        results = await search_taxonomy(batch)
+        if results is None:
+            return
+        if len(batch) == 1:
+            # The entry found is the taxon even when it was merged or renamed
+            if results:
+                ranks[batch[0]] = rank_from_taxonomy(results[0], selected_rank)
+            return
+        requested = set(batch)
+        for data in results:
+            if data['taxonId'] in requested:
+                ranks[data['taxonId']] = rank_from_taxonomy(data, selected_rank)
+        # Merged or renamed taxids come back under their new id, they are
+        # looked up one by one
+        await asyncio.gather(*(fetch_batch([taxid]) for taxid in batch if taxid not in ranks))
+    
+    batch_size = config.UNIPROT_TAXONOMY_BATCH_SIZE
+    await asyncio.gather(*(fetch_batch(remaining[i:i + batch_size]) for i in range(0, len(remaining), batch_size)))
+    
+    if lineages is not None and remaining:
+        resolved = {taxid: ranks[taxid] for taxid in remaining if taxid in ranks}
+        await loop.run_in_executor(None, lineages.put_many, selected_rank, resolved)
+    
+    for taxid in remaining:
+        ranks.setdefault(taxid, (None, None))
+    return ranks
+
 def requests_get(url, params):
     results = []
+    client = get_sync_client('uniprot')
     try:
-        response = requests.get(url, params=params)
+        response = governed_request_sync(client, uniprot_governor, 'GET', url, params=params)
         if response.status_code == 200:
             results.extend(response.json().get("results", []))
             while response.links.get("next", {}).get("url"):
                 next_url = response.links["next"]["url"]
-                response = requests.get(next_url, params=None)
+                response = governed_request_sync(client, uniprot_governor, 'GET', next_url)
                 results.extend(response.json().get("results", []))
             return results
-    except requests.exceptions.RequestException as e:
+    except httpx.HTTPError as e:
+        print(f"Request failed: {e}")
+
+class UniProtStreamParser:
+    """
+    Incremental parser of the `results` array of a UniProt JSON page: raw
+    bytes are fed as they arrive and each completed entry is decoded on its
+    own and passed through `convert`, so that only the entry being received
+    is held as text, never the whole page
+    """
+    RESULTS_START = re.compile(r'"results"\s*:\s*\[')
+
+    def __init__(self, convert=None):
+        self.convert = convert or (lambda entry: entry)
+        self.text_decoder = codecs.getincrementaldecoder('utf-8')()
+        self.json_decoder = json.JSONDecoder()
+        self.buffer = ''
+        self.started = False
+        self.finished = False
+
+    def feed(self, data):
+        self.buffer += self.text_decoder.decode(data)
+        return self.read_entries()
+
+    def close(self):
+        self.buffer += self.text_decoder.decode(b'', final=True)
+        entries = self.read_entries()
+        if not self.finished:
+            raise ValueError("UniProt response ended before its results")
+        return entries
+
+    def read_entries(self):
+        entries = []
+        if not self.started:
+            match = self.RESULTS_START.search(self.buffer)
+            if match is None:
+                return entries
+            self.buffer = self.buffer[match.end():]
+            self.started = True
+        
+        buffer = self.buffer
+        position = 0
+        while not self.finished:
+            while position < len(buffer) and buffer[position] in ' \t\r\n,':
+                position += 1
+            if position == len(buffer):
+                break
+            if buffer[position] == ']':
+                self.finished = True
+                position = len(buffer)
+                break
+            try:
+                entry, position = self.json_decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                # Entry not received whole yet
+                break
+            entries.append(self.convert(entry))
+        self.buffer = buffer[position:]
+        return entries
+
+async def requests_get_pages(url, params, convert=None, failures=None):
+    """
+    Async counterpart of requests_get, yielding the results of each page as
+    soon as it is received. Pages are parsed while they download (gzip
+    transfer encoding is decoded by httpx), each entry passed through
+    `convert` when given. The URL of a page that fails is appended to
+    `failures` when given, and ends the iteration
+    """
+    client = get_async_client('uniprot')
+    
+    async def consume(response):
+        parser = UniProtStreamParser(convert)
+        results = []
+        async for chunk in response.aiter_bytes():
+            results.extend(parser.feed(chunk))
+        results.extend(parser.close())
+        return results, response.links.get("next", {}).get("url")
+    
+    try:
+        next_url = url
+        while next_url:
+            results, next_url = await governed_stream(client, uniprot_governor, 'GET', next_url, consume, params=params)
+            params = None
+            yield results
+    except (httpx.HTTPError, ValueError) as e:
         print(f"Request failed: {e}")
+        if failures is not None:
+            failures.append(next_url)
+
+async def merge_pages(page_iterators, failures=None):
+    """
+    Run several paginated searches concurrently, yielding their pages as
+    soon as each is received. The shared rate limit paces their requests
+    The error of a search that fails is appended to `failures` when given
+    """
+    queue = asyncio.Queue()
+    
+    async def drain(pages):
+        try:
+            async for results in pages:
+                await queue.put(results)
+        except Exception as e:
+            print(f"Request failed: {e}")
+            if failures is not None:
+                failures.append(str(e))
+        finally:
+            queue.put_nowait(None)
+    
+    tasks = [asyncio.ensure_future(drain(pages)) for pages in page_iterators]
+    try:
+        running = len(tasks)
+        while running:
+            results = await queue.get()
+            if results is None:
+                running -= 1
+            else:
+                yield results
+    finally:
+        for task in tasks:
+            task.cancel()
+
+def uniprot_fasta_header(record):
+    """
+    FASTA header in the UniProtKB format, without the PE and SV fields
+    """
+    prefix = 'sp' if record.entry_type == 'SwissProt' else 'tr'
+    header = f">{prefix}|{record.accession}|{record.entry_name or record.accession}"
+    if record.protein_name:
+        header += f" {record.protein_name}"
+    if record.scientific_name:
+        header += f" OS={record.scientific_name}"
+    if record.taxid:
+        header += f" OX={record.taxid}"
+    if record.gene_name:
+        header += f" GN={record.gene_name}"
+    if record.merged_accessions:
+        # Entries with the same sequence, merged into this one by deduplicate_sequences
+        header += f" MERGED={','.join(record.merged_accessions)}"
+    return header
+
+async def iter_uniprot_fasta(selected_data, line_width=60):
+    """
+    FASTA of the selected UniProtKB records, one chunk per entry, with the
+    sequences read from the sequence store
+    """
+    for record in selected_data:
+        if record.database != 'UniProtKB' or record.sequence_ref is None:
+            continue
+        sequence = record.sequence_view()
+        lines = [uniprot_fasta_header(record).encode()]
+        lines.extend(sequence[start:start + line_width] for start in range(0, len(sequence), line_width))
+        yield b'\n'.join(lines) + b'\n'
 
 async def create_uniprot_fasta(base_url, params, loading_spinner):
     identifier = datetime.now().strftime("%d%m%Y%H%M%S")
     fasta_file = f"{identifier}_Uniprot.fasta"
     loading_spinner.set_visibility(True)
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.post("http://134.158.151.55/create_uniprot_fasta", json={"base_url": base_url, "params": params, "fasta_file": fasta_file})
-            if response.status_code == 200:
-                data = response.json()
-                print(f"Response from Flask (create_uniprot_fasta): {data}")
-                return data['file']
-            else:
-                print(f"Flask request failed with status code: {response.status_code}")
-                return 'Failed'
+        response = await get_async_client('pipeline').post(f"{config.API_BASE_URL}/create_uniprot_fasta", json={"base_url": base_url, "params": params, "fasta_file": fasta_file})
+        if response.status_code == 200:
+            data = response.json()
+            print(f"Response from Flask (create_uniprot_fasta): {data}")
+            return data['file']
+        else:
+            print(f"Flask request failed with status code: {response.status_code}")
+            return 'Failed'
     except Exception as e:
         print(f"Error occurred (create_uniprot_fasta): {e}")
         return 'Failed'